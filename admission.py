@@ -0,0 +1,257 @@
+"""
+Admission control for the image endpoints.
+
+Each hide, update or extract request is costed from the image header and the payload
+length before any pixels are decoded (estimate()):
+
+- memory: the decoded image times the copies held at the peak of the
+  operation (Pillow image, pixel array, bit buffers, PNG encoder), plus the
+  request body and the payload (for extraction, the most it may decompress to),
+- CPU: seconds of work for the carrier values and payload bytes processed.
+
+The AdmissionController of each server process keeps a memory budget, a cap
+on concurrent requests and a concurrency limit per technique. A request that
+fits starts straight away. Otherwise it waits in line for up to QUEUE_TIMEOUT
+seconds, and the first waiter that fits goes next. A request is rejected
+with a Retry-After hint (Rejected, 503) when the line is full or its wait
+runs out. One that could never fit the budget is rejected outright (413).
+stats() and the stego_admission_* metrics report utilization.
+"""
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+
+MB = 1024 * 1024
+
+# Full-image copies held at the peak of each operation, measured on RGB covers
+IMAGE_COPIES = {'hide': 4.0, 'update': 2.5, 'extract': 3.5}
+
+# Copies of the request body (raw bytes, base64 text, decoded image) and of the payload
+BODY_COPIES = 3.0
+PAYLOAD_COPIES = 2.0
+
+# CPU seconds per carrier value: PNG decode, bit-plane work and, for hide and update, PNG encode
+SECONDS_PER_VALUE = {'hide': 6e-8, 'update': 4e-8, 'extract': 8e-9}
+
+# CPU seconds per payload byte, and per request (AES derives a key when it is not cached)
+SECONDS_PER_PAYLOAD_BYTE = {'aes': 2e-7}
+DEFAULT_SECONDS_PER_PAYLOAD_BYTE = 2e-8
+FIXED_SECONDS = {'aes': 0.1}
+
+# The memory budget never defaults below this
+MIN_MEMORY_BUDGET = 256 * MB
+
+Cost = namedtuple('Cost', ['memory_bytes', 'seconds'])
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after=None, status=503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+
+def estimate(technique, operation, width, height, channels=3, bits=8, payload_bytes=0, body_bytes=0):
+    """Cost of hiding, updating or extracting with technique in a width x height cover"""
+    values = width * height * channels
+    memory = (values * (bits // 8) * IMAGE_COPIES[operation]
+              + body_bytes * BODY_COPIES + payload_bytes * PAYLOAD_COPIES)
+    seconds = (values * SECONDS_PER_VALUE[operation]
+               + payload_bytes * SECONDS_PER_PAYLOAD_BYTE.get(technique, DEFAULT_SECONDS_PER_PAYLOAD_BYTE)
+               + FIXED_SECONDS.get(technique, 0.0))
+    return Cost(int(memory), seconds)
+
+
+class Ticket:
+    """An admitted request; release() (or leaving the with block) frees its budget"""
+
+    def __init__(self, controller, technique, cost):
+        self.controller = controller
+        self.technique = technique
+        self.cost = cost
+        self.started = time.monotonic()
+
+    def release(self):
+        self.controller.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Memory and concurrency budgets shared by the requests of one process.
+
+    max_active of 0 disables admission control. technique_limits caps the
+    concurrent requests of a technique (max_active when not listed).
+    """
+
+    def __init__(self, memory_budget, max_active, technique_limits=None, queue_size=32, queue_timeout=15.0):
+        self.memory_budget = memory_budget
+        self.max_active = max_active
+        self.technique_limits = dict(technique_limits or {})
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = set()
+        self._memory = 0
+        self._by_technique = {}  # technique -> [active, memory bytes]
+        self._waiting = []       # [technique, cost] in arrival order
+        self._counts = {'admitted': 0, 'queued': 0, 'rejected': 0}
+
+    @property
+    def enabled(self):
+        return self.max_active > 0
+
+    def limit(self, technique):
+        return self.technique_limits.get(technique, self.max_active)
+
+    def _fits(self, technique, cost):
+        active = self._by_technique.get(technique, (0, 0))[0]
+        return (len(self._active) < self.max_active and active < self.limit(technique)
+                and self._memory + cost.memory_bytes <= self.memory_budget)
+
+    def _next_waiter(self):
+        return next((entry for entry in self._waiting if self._fits(*entry)), None)
+
+    def _count(self, technique, decision):
+        self._counts[decision] += 1
+        metrics.ADMISSION_DECISIONS.inc(technique=technique, decision=decision)
+
+    def _retry_after(self, cost):
+        """Seconds until enough admitted work should have finished for cost to fit"""
+        now = time.monotonic()
+        free = self.memory_budget - self._memory
+        slots = self.max_active - len(self._active)
+        wait = 0.0
+        for ticket in sorted(self._active, key=lambda t: t.started + t.cost.seconds):
+            if free >= cost.memory_bytes and slots > 0:
+                break
+            free += ticket.cost.memory_bytes
+            slots += 1
+            wait = max(ticket.started + ticket.cost.seconds - now, 0.0)
+        # Requests already in line go first
+        wait += sum(entry[1].seconds for entry in self._waiting) / max(self.max_active, 1)
+        return max(math.ceil(wait), 1)
+
+    def _reject(self, technique, message, cost, status=503):
+        self._count(technique, 'rejected')
+        retry_after = self._retry_after(cost) if status == 503 else None
+        raise Rejected(message, retry_after, status)
+
+    def _admit(self, technique, cost, waited):
+        ticket = Ticket(self, technique, cost)
+        self._active.add(ticket)
+        self._memory += cost.memory_bytes
+        usage = self._by_technique.setdefault(technique, [0, 0])
+        usage[0] += 1
+        usage[1] += cost.memory_bytes
+        self._count(technique, 'admitted')
+        metrics.ADMISSION_WAIT_SECONDS.observe(waited, technique=technique)
+        metrics.ADMISSION_ACTIVE.set(usage[0], technique=technique)
+        metrics.ADMISSION_MEMORY_BYTES.set(usage[1], technique=technique)
+        return ticket
+
+    def acquire(self, technique, cost, timeout=None):
+        """Ticket for a request of this cost, waiting up to timeout seconds; raises Rejected"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._cond:
+            if cost.memory_bytes > self.memory_budget:
+                self._reject(technique, f"Request needs an estimated {cost.memory_bytes // MB} MB, "
+                                        f"more than this server's budget of {self.memory_budget // MB} MB",
+                             cost, status=413)
+            if not self._waiting and self._fits(technique, cost):
+                return self._admit(technique, cost, 0.0)
+            if len(self._waiting) >= self.queue_size:
+                self._reject(technique, "Server busy, try again later", cost)
+
+            entry = [technique, cost]
+            self._waiting.append(entry)
+            self._count(technique, 'queued')
+            metrics.ADMISSION_WAITING.set(len(self._waiting))
+            start = time.monotonic()
+            try:
+                while self._next_waiter() is not entry:
+                    remaining = start + timeout - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(technique, "Server busy, try again later", cost)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(entry)
+                metrics.ADMISSION_WAITING.set(len(self._waiting))
+                # The next waiter may fit now that this one has left the line
+                self._cond.notify_all()
+            return self._admit(technique, cost, time.monotonic() - start)
+
+    def release(self, ticket):
+        with self._cond:
+            if ticket not in self._active:
+                return
+            self._active.discard(ticket)
+            self._memory -= ticket.cost.memory_bytes
+            usage = self._by_technique[ticket.technique]
+            usage[0] -= 1
+            usage[1] -= ticket.cost.memory_bytes
+            metrics.ADMISSION_ACTIVE.set(usage[0], technique=ticket.technique)
+            metrics.ADMISSION_MEMORY_BYTES.set(usage[1], technique=ticket.technique)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "memory_budget_bytes": self.memory_budget,
+                "memory_in_use_bytes": self._memory,
+                "memory_utilization": round(self._memory / self.memory_budget, 4) if self.memory_budget else 0.0,
+                "active": len(self._active),
+                "max_active": self.max_active,
+                "waiting": len(self._waiting),
+                "queue_size": self.queue_size,
+                "techniques": {
+                    technique: {"active": active, "limit": self.limit(technique), "memory_in_use_bytes": memory}
+                    for technique, (active, memory) in sorted(self._by_technique.items())
+                },
+                **self._counts
+            }
+
+
+def default_memory_budget():
+    """Half the physical memory, split between the server worker processes (WEB_CONCURRENCY)"""
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return 4 * MIN_MEMORY_BUDGET
+    workers = int(os.environ.get('WEB_CONCURRENCY', 0)) or 1
+    return max(total // 2 // workers, MIN_MEMORY_BUDGET)
+
+
+def parse_limits(spec):
+    """Per-technique limits from 'aes=2,lsb=8'"""
+    limits = {}
+    for part in filter(None, (piece.strip() for piece in spec.split(','))):
+        technique, _, limit = part.partition('=')
+        limits[technique.strip().lower()] = int(limit)
+    return limits
+
+
+_max_active = int(os.environ.get('ADMISSION_MAX_ACTIVE', os.cpu_count() or 1))
+
+# One controller per server process; AES also runs the KDF, so by default it
+# gets half the slots
+controller = AdmissionController(
+    memory_budget=int(os.environ.get('ADMISSION_MEMORY_MB', 0)) * MB or default_memory_budget(),
+    max_active=_max_active,
+    technique_limits={'aes': max(_max_active // 2, 1),
+                      **parse_limits(os.environ.get('ADMISSION_TECHNIQUE_LIMITS', ''))},
+    queue_size=int(os.environ.get('ADMISSION_QUEUE_SIZE', 32)),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 15))
+)
@@ -1,140 +1,282 @@
 # In aes_steganography.py - Improved implementation:
 
 import numpy as np
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.backends import default_backend
 import os
 import hashlib
+import logging
+import struct
 
-class AESSteganography:
-    def __init__(self):
-        # Remove unnecessary dictionary mappings
-        pass
+import bitplane
+import engines
+import frame as framing
+import kdf
+
+logger = logging.getLogger(__name__)
+
+# Images written since the KDF upgrade start their encrypted blob with this
+# header (magic, version, KDF id, packed KDF params, salt). Legacy blobs start
+# directly with the IV and use the unsalted derive_key().
+KDF_MAGIC = b'\x89SGK'
+KDF_HEADER = struct.Struct('>4sBBI16s')
+
+# The header version picks the cipher of the rest of the blob:
+#   2: IV (16) | AES-CBC ciphertext with PKCS7 padding
+#   3: nonce (12) | AES-GCM ciphertext | tag (16), the header authenticated as AAD
+KDF_VERSION = 2
+GCM_VERSION = 3
+
+CIPHER_CBC = 'cbc'
+CIPHER_GCM = 'gcm'
+
+AES_IV_BYTES = 16
+AES_BLOCK_BYTES = 16
+GCM_NONCE_BYTES = 12
+GCM_TAG_BYTES = 16
+
+
+class AuthenticationError(ValueError):
+    """The GCM tag did not match: wrong key or a modified image"""
+
+class AESSteganography(engines.Steganography):
+    """The payload sealed in an AES-GCM (or CBC) blob under a key derived from the user's"""
+    name = 'aes'
+    requires_key = True
+    header_bytes = KDF_HEADER.size
+    
+    def __init__(self, kdf_id=kdf.KDF_PBKDF2, kdf_params=(kdf.DEFAULT_PBKDF2_ITERATIONS,), cipher=CIPHER_GCM):
+        if cipher not in (CIPHER_CBC, CIPHER_GCM):
+            raise ValueError(f"Unknown cipher '{cipher}'")
+        kdf.check_params(kdf_id, kdf_params)
+        self.kdf_id = kdf_id
+        self.kdf_params = tuple(kdf_params)
+        self.cipher = cipher
+    
+    @property
+    def overhead_bytes(self):
+        """Fixed cost of a blob: KDF header plus nonce and tag (GCM) or IV and minimum padding (CBC)"""
+        if self.cipher == CIPHER_GCM:
+            return KDF_HEADER.size + GCM_NONCE_BYTES + GCM_TAG_BYTES
+        return KDF_HEADER.size + AES_IV_BYTES + 1
+    
+    def capacity(self, shape, k=1, codec=framing.CODEC_NONE, flags=0):
+        """Largest plaintext in bytes (after compression) whose blob fits at k bits per value"""
+        available = framing.make_frame(k, codec, flags).payload_capacity(shape)
+        if self.cipher == CIPHER_GCM:
+            return max(available - self.overhead_bytes, 0)
+        blocks = (available - KDF_HEADER.size - AES_IV_BYTES) // AES_BLOCK_BYTES
+        return max(blocks * AES_BLOCK_BYTES - 1, 0)
+    
+    def text_payload(self, secret_text):
+        """(bytes, frame flags) encrypted for secret_text: always UTF-8, so never flagged"""
+        return secret_text.encode('utf-8'), 0
+    
+    def payload_text(self, data, flags):
+        """Decrypted text, always UTF-8"""
+        return data.decode('utf-8')
     
     def derive_key(self, userkey):
-        """Derive a consistent 16-byte key from user input"""
+        """Derive a consistent 16-byte key from user input (legacy images)"""
         return hashlib.sha256(userkey.encode()).digest()[:16]
     
+    def _new_key(self, userkey):
+        """Fresh salt, returning (versioned header, derived key)"""
+        salt = os.urandom(kdf.SALT_BYTES)
+        version = GCM_VERSION if self.cipher == CIPHER_GCM else KDF_VERSION
+        header = KDF_HEADER.pack(KDF_MAGIC, version, self.kdf_id,
+                                 kdf.pack_params(self.kdf_id, self.kdf_params), salt)
+        # A fresh salt is never looked up again, so only extraction goes through the cache
+        return header, kdf.derive(userkey, salt, self.kdf_id, self.kdf_params)
+    
+    def _key_for(self, blob_start, userkey):
+        """(key, KDF header length, cipher) for a stored blob; legacy blobs have no header and use CBC"""
+        if len(blob_start) >= KDF_HEADER.size and blob_start[:4] == KDF_MAGIC:
+            magic, version, kdf_id, packed, salt = KDF_HEADER.unpack(blob_start[:KDF_HEADER.size])
+            if version not in (KDF_VERSION, GCM_VERSION):
+                raise ValueError(f"Unsupported AES header version {version}")
+            # The header comes from the image: refuse unknown or costly KDFs before deriving
+            try:
+                params = kdf.unpack_params(kdf_id, packed)
+                kdf.check_params(kdf_id, params)
+            except ValueError as e:
+                raise ValueError(f"No hidden data found ({e})") from e
+            cipher = CIPHER_GCM if version == GCM_VERSION else CIPHER_CBC
+            return kdf.key_cache.derive(userkey, salt, kdf_id, params), KDF_HEADER.size, cipher
+        return self.derive_key(userkey), 0, CIPHER_CBC
+    
+    def _sealer(self, userkey):
+        """
+        Start a new blob, returning (prefix, encrypt, finish): the blob is
+        prefix, then encrypt(chunk) for every chunk, then finish().
+        """
+        header, key = self._new_key(userkey)
+        
+        if self.cipher == CIPHER_GCM:
+            nonce = os.urandom(GCM_NONCE_BYTES)
+            encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce), backend=default_backend()).encryptor()
+            encryptor.authenticate_additional_data(header)
+            
+            def finish():
+                return encryptor.finalize() + encryptor.tag
+            return header + nonce, encryptor.update, finish
+        
+        iv = os.urandom(AES_IV_BYTES)
+        padder = padding.PKCS7(128).padder()
+        encryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).encryptor()
+        
+        def encrypt(chunk):
+            return encryptor.update(padder.update(chunk))
+        
+        def finish():
+            return encryptor.update(padder.finalize()) + encryptor.finalize()
+        return header + iv, encrypt, finish
+    
+    def _decryptor(self, key, cipher, header, iv, tag=None):
+        """(decrypt, finish) for a stored blob; finish raises AuthenticationError on a GCM tag mismatch"""
+        if cipher == CIPHER_GCM:
+            decryptor = Cipher(algorithms.AES(key), modes.GCM(iv, tag), backend=default_backend()).decryptor()
+            decryptor.authenticate_additional_data(header)
+            
+            def finish():
+                try:
+                    return decryptor.finalize()
+                except InvalidTag:
+                    raise AuthenticationError("Wrong key or modified image (authentication failed)") from None
+            return decryptor.update, finish
+        
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).decryptor()
+        unpadder = padding.PKCS7(128).unpadder()
+        
+        def decrypt(chunk):
+            return unpadder.update(decryptor.update(chunk))
+        
+        def finish():
+            return unpadder.update(decryptor.finalize()) + unpadder.finalize()
+        return decrypt, finish
+    
+    @staticmethod
+    def _framing(cipher):
+        """(IV or nonce bytes, tag bytes, smallest valid body) of a blob after its KDF header"""
+        if cipher == CIPHER_GCM:
+            return GCM_NONCE_BYTES, GCM_TAG_BYTES, GCM_NONCE_BYTES + GCM_TAG_BYTES
+        # IV plus at least one block
+        return AES_IV_BYTES, 0, AES_IV_BYTES + AES_BLOCK_BYTES
+    
     def encrypt_message(self, msg, userkey):
         """Encrypt message with proper error handling"""
         try:
-            key = self.derive_key(userkey)
-            iv = os.urandom(16)
-            
-            # Pad the message properly
-            padder = padding.PKCS7(128).padder()
-            padded_data = padder.update(msg.encode('utf-8')) + padder.finalize()
-            
-            # Encrypt
-            cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-            encryptor = cipher.encryptor()
-            ct = encryptor.update(padded_data) + encryptor.finalize()
-            
-            return iv + ct
+            prefix, encrypt, finish = self._sealer(userkey)
+            return prefix + encrypt(msg.encode('utf-8')) + finish()
         except Exception as e:
-            print(f"Encryption error: {e}")
+            logger.error("Encryption error: %s", e)
             raise
     
     def decrypt_message(self, cipher_bytes, userkey):
-        """Decrypt message with proper error handling"""
+        """
+        Decrypt message with proper error handling.
+        
+        GCM blobs are authenticated before the text is decoded, and a failed
+        check raises AuthenticationError instead of returning an error string.
+        """
         try:
-            if len(cipher_bytes) < 32:  # Minimum size for IV + at least one block
-                return "Invalid encrypted data"
-                
-            key = self.derive_key(userkey)
-            iv = cipher_bytes[:16]
-            ct = cipher_bytes[16:]
+            key, header_len, cipher = self._key_for(cipher_bytes, userkey)
+            header, body = cipher_bytes[:header_len], cipher_bytes[header_len:]
             
-            cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
-            decryptor = cipher.decryptor()
-            padded_data = decryptor.update(ct) + decryptor.finalize()
+            iv_len, tag_len, min_len = self._framing(cipher)
+            if len(body) < min_len:
+                return "Invalid encrypted data"
             
-            # Unpad
-            unpadder = padding.PKCS7(128).unpadder()
-            data = unpadder.update(padded_data) + unpadder.finalize()
+            iv = body[:iv_len]
+            ct = body[iv_len:len(body) - tag_len]
+            decrypt, finish = self._decryptor(key, cipher, header, iv, body[len(body) - tag_len:] if tag_len else None)
+            data = decrypt(ct) + finish()
             
             return data.decode('utf-8')
+        except AuthenticationError:
+            logger.info("Decryption rejected: authentication failed")
+            raise
         except Exception as e:
-            print(f"Decryption error: {e}")
+            logger.warning("Decryption error: %s", e)
             return f"Extraction failed: {str(e)}"
     
-    def hide_data(self, image_array, secret_text, encryption_key):
-        """Hide encrypted data in image"""
+    def _read_length(self, x, frame, order, encryption_key):
+        """Length of the blob from the header, raising if the image cannot hold it"""
+        total_pixels = bitplane.carrier_size(x.shape)
+        if total_pixels < frame.values_needed(0):
+            raise ValueError("Image too small to contain hidden data")
+        
+        # Extract data length first (4 bytes = 32 bits)
+        len_bytes = bitplane.read_bytes(x, frame.start, 4, order, frame.k)
+        data_len = int.from_bytes(len_bytes, byteorder='big')
+        
+        # Reject lengths this image could never hold before reading on
+        capacity = frame.payload_capacity(x.shape)
+        if data_len > capacity:
+            raise ValueError(f"No hidden data found (header claims {data_len} bytes, image holds at most {capacity})")
+        return data_len
+    
+    def _open(self, read, data_len, encryption_key, chunk_size):
+        """
+        Decrypted chunks of the blob.
+        
+        Chunks are released before the blob is verified: a wrong key or a
+        modified image raises at the end (AuthenticationError for GCM blobs),
+        so callers must discard what they received when it does.
+        """
+        blob_start = read(0, min(data_len, KDF_HEADER.size))
+        key, header_len, cipher = self._key_for(blob_start, encryption_key)
+        data_len -= header_len
+        iv_len, tag_len, min_len = self._framing(cipher)
+        if data_len < min_len:
+            raise ValueError("Invalid encrypted data")
+        
+        iv = read(header_len, iv_len)
+        ct_start = header_len + iv_len
+        ct_len = data_len - iv_len - tag_len
+        
+        # The GCM tag sits after the ciphertext but is needed up front
+        tag = read(ct_start + ct_len, tag_len) if tag_len else None
+        decrypt, finish = self._decryptor(key, cipher, blob_start[:header_len], iv, tag)
+        
+        for start, count in bitplane.iter_ranges(ct_len, chunk_size):
+            data = decrypt(read(ct_start + start, count))
+            if data:
+                yield data
+        
+        tail = finish()
+        if tail:
+            yield tail
+    
+    def _body_evidence(self, read, length, encryption_key):
+        """'aes_header' for a KDF header, 'length' for a plausible legacy blob, else None"""
         try:
-            x = np.array(image_array, copy=True).astype(np.uint8)
-            encrypted_bytes = self.encrypt_message(secret_text, encryption_key)
-            
-            height, width, channels = x.shape
-            total_pixels = height * width * channels
-            
-            # Check if image is large enough
-            if len(encrypted_bytes) > total_pixels:
-                raise ValueError(f"Image too small. Need {len(encrypted_bytes)} bytes, have {total_pixels}")
-            
-            # Flatten image for easier manipulation
-            flat_image = x.reshape(-1)
-            
-            # Embed data length first (4 bytes)
-            data_len = len(encrypted_bytes)
-            len_bytes = data_len.to_bytes(4, byteorder='big')
-            
-            # Combine length and data
-            all_data = len_bytes + encrypted_bytes
-            
-            # Embed data using LSB technique for robustness
-            for i, byte in enumerate(all_data):
-                if i * 8 >= len(flat_image):
-                    break
-                
-                # Embed each bit in LSB of consecutive pixels
-                for bit_pos in range(8):
-                    pixel_idx = i * 8 + bit_pos
-                    if pixel_idx < len(flat_image):
-                        # Clear LSB and set to current bit
-                        flat_image[pixel_idx] = (flat_image[pixel_idx] & 0xFE) | ((byte >> (7 - bit_pos)) & 1)
-            
-            return flat_image.reshape(x.shape)
-            
-        except Exception as e:
-            print(f"Hide data error: {e}")
-            raise
+            blob_start = read(0, min(length, KDF_HEADER.size))
+        except ValueError:
+            # The blob starts past the decoded rows
+            blob_start = b''
+        if blob_start[:4] == KDF_MAGIC and len(blob_start) == KDF_HEADER.size:
+            version = KDF_HEADER.unpack(blob_start)[1]
+            if version == GCM_VERSION and length >= KDF_HEADER.size + GCM_NONCE_BYTES + GCM_TAG_BYTES:
+                return 'aes_header'
+            if version == KDF_VERSION and (length - KDF_HEADER.size - AES_IV_BYTES) % AES_BLOCK_BYTES == 0:
+                return 'aes_header'
+        # Legacy blobs are an IV and at least one CBC block
+        if length >= AES_IV_BYTES + AES_BLOCK_BYTES and length % AES_BLOCK_BYTES == 0:
+            return 'length'
+        return None
     
-    def extract_data(self, image_array, encryption_key):
+    def extract_data(self, image_array, encryption_key='', scatter=False):
         """Extract and decrypt data from image"""
         try:
-            x = np.array(image_array, copy=True).astype(np.uint8)
-            flat_image = x.reshape(-1)
-            
-            # Extract data length first (4 bytes = 32 bits)
-            data_len = 0
-            for i in range(4):
-                byte = 0
-                for bit_pos in range(8):
-                    pixel_idx = i * 8 + bit_pos
-                    if pixel_idx < len(flat_image):
-                        bit = flat_image[pixel_idx] & 1
-                        byte = (byte << 1) | bit
-                data_len = (data_len << 8) | byte
-            
-            # Extract the encrypted data
-            encrypted_data = bytearray()
-            total_bits_needed = data_len * 8
-            
-            for i in range(4, 4 + data_len):
-                if (i * 8) + 8 > len(flat_image):
-                    break
-                    
-                byte = 0
-                for bit_pos in range(8):
-                    pixel_idx = i * 8 + bit_pos
-                    if pixel_idx < len(flat_image):
-                        bit = flat_image[pixel_idx] & 1
-                        byte = (byte << 1) | bit
-                encrypted_data.append(byte)
-            
-            return self.decrypt_message(bytes(encrypted_data), encryption_key)
-            
+            return super().extract_data(image_array, encryption_key, scatter=scatter)
+        except AuthenticationError:
+            raise
         except Exception as e:
-            print(f"Extract data error: {e}")
-            return f"Extraction failed: {str(e)}"
\ No newline at end of file
+            logger.warning("Extract data error: %s", e)
+            return f"Extraction failed: {str(e)}"
+
+
+engines.register(AESSteganography())
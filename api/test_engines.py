@@ -0,0 +1,114 @@
+"""
+Images written by earlier versions of the engines must keep extracting.
+
+The *_baseline.png fixtures were written by the LSB, XOR and AES (CBC with
+the unsalted key) engines of the first commit, into seeded noise covers, and
+aes_gcm.png by the salted AES-GCM engine.
+"""
+import base64
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import bitplane
+import engines
+from aes_steganography import GCM_NONCE_BYTES, GCM_TAG_BYTES, KDF_HEADER, AuthenticationError
+from image_io import bytes_to_image
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# (fixture, technique, key, hidden text)
+BASELINE = [
+    ('lsb_baseline.png', 'lsb', '', 'Baseline LSB message, caf\xe9 \xa9 2024'),
+    ('xor_baseline.png', 'xor', 'k\xe9y!', 'Baseline XOR message, na\xefve r\xe9sum\xe9'),
+    ('aes_cbc_baseline.png', 'aes', 'passphrase', 'Baseline AES-CBC message ✓ \xfcber'),
+]
+
+GCM_FIXTURE = 'aes_gcm.png'
+GCM_KEY = 'passphrase'
+GCM_TEXT = 'AES-GCM message ✓'
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name, technique, key, text', BASELINE)
+def test_baseline_text(name, technique, key, text):
+    image = bytes_to_image(read_fixture(name))
+    assert engines.get_engine(technique).extract(image, key) == text
+
+
+@pytest.mark.parametrize('name, technique, key, text', BASELINE)
+def test_baseline_bytes(name, technique, key, text):
+    engine = engines.get_engine(technique)
+    image = bytes_to_image(read_fixture(name))
+    assert engine.extract(image, key, binary=True) == engine.encode_text(text)
+
+
+@pytest.mark.parametrize('name, technique, key, text', BASELINE)
+def test_baseline_api(name, technique, key, text):
+    from app import app
+
+    response = app.test_client().post('/api/extract', json={
+        'image': base64.b64encode(read_fixture(name)).decode(),
+        'technique': technique,
+        'encryption_key': key,
+    })
+    assert response.status_code == 200
+    assert response.get_json()['extracted_text'] == text
+
+
+
+def test_gcm_fixture():
+    image = bytes_to_image(read_fixture(GCM_FIXTURE))
+    assert engines.get_engine('aes').extract(image, GCM_KEY) == GCM_TEXT
+
+
+def _gcm_offsets():
+    """Byte offsets into the blob of one byte of the salt, nonce, ciphertext and tag"""
+    nonce = KDF_HEADER.size
+    ciphertext = nonce + GCM_NONCE_BYTES
+    tag = ciphertext + len(GCM_TEXT.encode('utf-8'))
+    return {'salt': KDF_HEADER.size - 1, 'nonce': nonce, 'ciphertext': ciphertext + 2, 'tag': tag + GCM_TAG_BYTES - 1}
+
+
+def tampered_gcm(part):
+    """The GCM fixture with one bit of the given part of its blob flipped"""
+    image = bytes_to_image(read_fixture(GCM_FIXTURE))
+    # The blob follows the 4-byte length, one bit per sample
+    image.reshape(-1)[bitplane.HEADER_BITS + _gcm_offsets()[part] * 8 + 7] ^= 1
+    return image
+
+
+@pytest.mark.parametrize('part', sorted(_gcm_offsets()))
+@pytest.mark.parametrize('binary', [False, True])
+def test_tampered_gcm_raises(part, binary):
+    with pytest.raises(AuthenticationError):
+        engines.get_engine('aes').extract(tampered_gcm(part), GCM_KEY, binary=binary)
+
+
+def test_gcm_wrong_key_raises():
+    image = bytes_to_image(read_fixture(GCM_FIXTURE))
+    with pytest.raises(AuthenticationError):
+        engines.get_engine('aes').extract(image, 'not the passphrase')
+
+
+@pytest.mark.parametrize('part', sorted(_gcm_offsets()))
+def test_tampered_gcm_api(part):
+    from app import app
+
+    buffer = BytesIO()
+    Image.fromarray(tampered_gcm(part)).save(buffer, 'PNG')
+    response = app.test_client().post('/api/extract', json={
+        'image': base64.b64encode(buffer.getvalue()).decode(),
+        'technique': 'aes',
+        'encryption_key': GCM_KEY,
+    })
+    assert response.status_code == 400
+    body = response.get_json()
+    assert 'extracted_text' not in body
+    assert 'authentication failed' in body['error']
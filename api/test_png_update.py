@@ -0,0 +1,175 @@
+"""
+png_update.update() on PNGs of every colour type, bit depth and filter type.
+
+Covers are written here with one filter type on every row, since encoders
+pick filters adaptively. Results are decoded with Pillow and must differ from
+the cover only in the k low bit planes, keep valid chunk CRCs and a zlib
+stream whose checksum verifies, and give back the message.
+"""
+import struct
+import zlib
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import engines
+import png_update
+from png_scanlines import SIGNATURE, iter_chunks
+
+WIDTH, HEIGHT = 37, 96
+
+# mode: (PNG colour type, bit depth, channels)
+LAYOUTS = {
+    'L': (0, 8, 1),
+    'LA': (4, 8, 2),
+    'RGB': (2, 8, 3),
+    'RGBA': (6, 8, 4),
+    'I;16': (0, 16, 1),
+}
+
+FILTERS = [0, 1, 2, 3, 4]
+
+MESSAGE = 'A message that fits in the top rows ✓'
+LONGER = MESSAGE + ', and a few words more'
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def filter_rows(lines, filter_type, bpp):
+    """Filtered scanlines, filter byte included, with filter_type on every row"""
+    out = []
+    prev = np.zeros(lines.shape[1], dtype=np.int16)
+    for line in lines.astype(np.int16):
+        left = np.concatenate([np.zeros(bpp, dtype=np.int16), line[:-bpp]])
+        up_left = np.concatenate([np.zeros(bpp, dtype=np.int16), prev[:-bpp]])
+        predictor = [0, left, prev, (left + prev) // 2, _paeth(left, prev, up_left)][filter_type]
+        out.append(bytes([filter_type]) + ((line - predictor) & 0xFF).astype(np.uint8).tobytes())
+        prev = line
+    return b''.join(out)
+
+
+def _chunk(kind, data):
+    return struct.pack('>I4s', len(data), kind) + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def make_png(pixels, mode, filter_type):
+    """PNG of pixels (uint8, or uint16 for 16-bit) with filter_type on every row"""
+    color_type, depth, channels = LAYOUTS[mode]
+    samples = pixels.astype('>u2') if depth == 16 else pixels
+    lines = samples.view(np.uint8).reshape(pixels.shape[0], -1)
+    ihdr = struct.pack('>IIBBBBB', pixels.shape[1], pixels.shape[0], depth, color_type, 0, 0, 0)
+    idat = zlib.compress(filter_rows(lines, filter_type, channels * depth // 8))
+    return SIGNATURE + _chunk(b'IHDR', ihdr) + _chunk(b'IDAT', idat) + _chunk(b'IEND', b'')
+
+
+def make_cover(mode, seed=0):
+    color_type, depth, channels = LAYOUTS[mode]
+    shape = (HEIGHT, WIDTH) if channels == 1 else (HEIGHT, WIDTH, channels)
+    dtype = np.uint16 if depth == 16 else np.uint8
+    return np.random.RandomState(seed).randint(0, np.iinfo(dtype).max + 1, shape).astype(dtype)
+
+
+def decode(png_bytes):
+    with Image.open(BytesIO(png_bytes)) as image:
+        image.load()
+        return image.mode, np.asarray(image)
+
+
+def check_stream(png_bytes):
+    """Verify every chunk CRC and the zlib checksum of the image data"""
+    idat = []
+    for kind, start, length in iter_chunks(png_bytes):
+        data = png_bytes[start:start + length]
+        assert struct.unpack('>I', png_bytes[start + length:start + length + 4])[0] == zlib.crc32(kind + data)
+        if kind == b'IDAT':
+            idat.append(data)
+    # zlib.decompress checks the Adler-32 trailer
+    return zlib.decompress(b''.join(idat))
+
+
+def check_update(cover, mode, png_bytes, message, k, technique='lsb', key=''):
+    decoded_mode, pixels = decode(png_bytes)
+    assert decoded_mode == mode
+    high = ~np.array((1 << k) - 1, dtype=cover.dtype)
+    assert np.array_equal(pixels & high, cover & high)
+
+    raw = check_stream(png_bytes)
+    channels, depth = LAYOUTS[mode][2], LAYOUTS[mode][1]
+    assert len(raw) == HEIGHT * (WIDTH * channels * depth // 8 + 1)
+
+    assert engines.get_engine(technique).extract(np.array(pixels), key) == message
+
+
+def test_covers_decode():
+    for mode in LAYOUTS:
+        cover = make_cover(mode)
+        for filter_type in FILTERS:
+            assert np.array_equal(decode(make_png(cover, mode, filter_type))[1], cover)
+
+
+@pytest.mark.parametrize('mode', sorted(LAYOUTS))
+@pytest.mark.parametrize('filter_type', FILTERS)
+@pytest.mark.parametrize('k', [1, 2])
+def test_update(mode, filter_type, k, monkeypatch):
+    # A window smaller than the image, so there are rows below it to copy
+    monkeypatch.setattr(png_update, 'MIN_WINDOW_BYTES', 64)
+    cover = make_cover(mode)
+    png_bytes, stats = png_update.update(make_png(cover, mode, filter_type), MESSAGE, k=k)
+    assert stats['update_mode'] == 'split'
+    check_update(cover, mode, png_bytes, MESSAGE, k)
+
+    # The second update only rewrites the window rows of the first
+    png_bytes, stats = png_update.update(png_bytes, LONGER, k=k)
+    assert stats['update_mode'] == 'window'
+    assert stats['rows_rewritten'] < HEIGHT
+    check_update(cover, mode, png_bytes, LONGER, k)
+
+
+@pytest.mark.parametrize('technique, key', [('xor', 'k\xe9y'), ('aes', 'passphrase')])
+def test_update_keyed(technique, key, monkeypatch):
+    monkeypatch.setattr(png_update, 'MIN_WINDOW_BYTES', 64)
+    cover = make_cover('RGB', seed=1)
+    png_bytes = make_png(cover, 'RGB', 4)
+    for expected_mode in ('split', 'window'):
+        png_bytes, stats = png_update.update(png_bytes, MESSAGE, technique, key)
+        assert stats['update_mode'] == expected_mode
+        check_update(cover, 'RGB', png_bytes, MESSAGE, 1, technique, key)
+
+
+def test_update_compressed():
+    cover = make_cover('RGBA', seed=2)
+    png_bytes, stats = png_update.update(make_png(cover, 'RGBA', 3), LONGER * 4, codec='zlib')
+    assert stats['update_mode'] == 'split'
+    check_update(cover, 'RGBA', png_bytes, LONGER * 4, 1)
+
+
+def test_scatter_falls_back_to_full():
+    cover = make_cover('RGB', seed=3)
+    png_bytes, stats = png_update.update(make_png(cover, 'RGB', 2), MESSAGE, 'xor', 'key', scatter=True)
+    assert stats['update_mode'] == 'full'
+    check_stream(png_bytes)
+    pixels = decode(png_bytes)[1]
+    assert np.array_equal(pixels & 0xFE, cover & 0xFE)
+    assert engines.get_engine('xor').extract(np.array(pixels), 'key', scatter=True) == MESSAGE
+
+
+def test_16_bit_colour_falls_back_to_full():
+    # Pillow decodes 16-bit RGB to its high bytes, which the full path re-encodes at 8 bits
+    pixels16 = np.random.RandomState(4).randint(0, 1 << 16, (HEIGHT, WIDTH, 3)).astype(np.uint16)
+    png = (SIGNATURE
+           + _chunk(b'IHDR', struct.pack('>IIBBBBB', WIDTH, HEIGHT, 16, 2, 0, 0, 0))
+           + _chunk(b'IDAT', zlib.compress(filter_rows(pixels16.astype('>u2').view(np.uint8).reshape(HEIGHT, -1), 1, 6)))
+           + _chunk(b'IEND', b''))
+    png_bytes, stats = png_update.update(png, MESSAGE)
+    assert stats['update_mode'] == 'full'
+    check_stream(png_bytes)
+    mode, pixels = decode(png_bytes)
+    assert mode == 'RGB'
+    assert np.array_equal(pixels & 0xFE, (pixels16 >> 8).astype(np.uint8) & 0xFE)
+    assert engines.get_engine('lsb').extract(np.array(pixels)) == MESSAGE
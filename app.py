@@ -1,37 +1,39 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file, url_for
 from flask_cors import CORS
-import numpy as np
 import base64
+import binascii
 from io import BytesIO
-from PIL import Image
-import traceback
+import logging
 import sys
 import os
 
-print(f"🔍 Current directory: {os.path.dirname(os.path.abspath(__file__))}")
-print("📁 Directory contents:")
-for file in os.listdir('.'):
-    print(f"   - {file}")
-
-# Import your steganography modules directly (they're in root)
-try:
-    from aes_steganography import AESSteganography
-    from lsb_steganography import LSBSteganography
-    from xor_steganography import XORSteganography
-    print("✅ Steganography modules imported successfully")
-except ImportError as e:
-    print(f"❌ Error importing steganography modules: {e}")
-    traceback.print_exc()
-    # Create fallback classes to prevent crashes
-    class AESSteganography:
-        def hide_data(self, *args, **kwargs): raise Exception("AES module not loaded")
-        def extract_data(self, *args, **kwargs): raise Exception("AES module not loaded")
-    class LSBSteganography:
-        def hide_data(self, *args, **kwargs): raise Exception("LSB module not loaded")
-        def extract_data(self, *args, **kwargs): raise Exception("LSB module not loaded")
-    class XORSteganography:
-        def hide_data(self, *args, **kwargs): raise Exception("XOR module not loaded")
-        def extract_data(self, *args, **kwargs): raise Exception("XOR module not loaded")
+# LOG_LEVEL takes a standard level name, or OFF to silence logging entirely
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(
+    level=logging.CRITICAL + 1 if LOG_LEVEL == 'OFF' else LOG_LEVEL,
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger('app')
+
+# Steganography engines are shared instances looked up by technique name
+import engines
+from aes_steganography import AuthenticationError
+logger.info("Steganography engines registered: %s", ', '.join(engines.techniques()))
+
+import admission
+import batch
+import capacity
+import detect
+import frame as framing
+import jobs
+import kdf
+import metrics
+import payload_codec
+import png_update
+import result_cache
+from image_io import (
+    DEFAULT_PNG_PROFILE, decode_base64_image, bytes_to_image, encode_png, resolve_png_profile
+)
 
 app = Flask(__name__)
 
@@ -44,11 +46,19 @@ CORS(app, resources={
             "http://localhost:3000"
         ],
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "Accept"],
+        "allow_headers": ["Content-Type", "Authorization", "Accept", "X-Encryption-Key", "X-Secret-Text"],
+        "expose_headers": ["X-Stego-Technique", "X-Image-Size", "X-Stego-K", "X-Stego-Compression", "X-Stego-Update-Mode", "X-PNG-Profile", "X-Encoded-Size", "X-Encode-Time-Ms", "X-Result-Cache", "Server-Timing", "Retry-After"],
         "supports_credentials": False
     }
 })
 
+# Every API request gets a stage timer, reported as Server-Timing and
+# aggregated into /api/metrics when the response goes out
+@app.before_request
+def start_request_timer():
+    if request.method != 'OPTIONS' and request.path.startswith('/api/') and request.endpoint != 'metrics_endpoint':
+        g.timer = metrics.RequestTimer(request.endpoint or 'unknown')
+
 # Add CORS headers manually as backup
 @app.after_request
 def after_request(response):
@@ -60,10 +70,24 @@ def after_request(response):
     
     if origin in allowed_origins:
         response.headers.add('Access-Control-Allow-Origin', origin)
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept')
+        response.headers.add('Timing-Allow-Origin', origin)
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept,X-Encryption-Key,X-Secret-Text')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Stego-Technique,X-Image-Size,X-Stego-K,X-Stego-Compression,X-Stego-Update-Mode,X-PNG-Profile,X-Encoded-Size,X-Encode-Time-Ms,X-Result-Cache,Server-Timing,Retry-After')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    
+    timer = g.pop('timer', None)
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+        timer.finish(response.status_code, request.content_length, response.content_length)
     return response
 
+# Admitted requests hold their share of the memory budget until they finish
+@app.teardown_request
+def release_admission(exc):
+    ticket = g.pop('admission', None)
+    if ticket is not None:
+        ticket.release()
+
 # Handle preflight OPTIONS requests
 @app.route('/api/<path:path>', methods=['OPTIONS'])
 def options_handler(path):
@@ -72,41 +96,164 @@ def options_handler(path):
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['PNG_PROFILE'] = DEFAULT_PNG_PROFILE  # fast, balanced or smallest
+app.config['BATCH_MAX_ITEMS'] = int(os.environ.get('BATCH_MAX_ITEMS', 500))
+
+# Fields a raw image/* request must not put in its URL
+SECRET_FIELDS = ('secret_text', 'encryption_key')
+
+def read_request_data():
+    """
+    Return (fields, image_data) for a JSON, multipart/form-data or raw image/* request.
+    
+    JSON bodies carry the image as base64 in "image". Multipart bodies carry it as
+    an "image" file part with the other fields as form fields. Raw image/* bodies
+    take their fields from the query string, but never the secrets, which would
+    end up in access logs: the text comes base64-encoded in X-Secret-Text and
+    the key in X-Encryption-Key. Raises ValueError with a client-facing message.
+    """
+    if request.is_json:
+        fields = request.get_json(silent=True)
+        if not fields:
+            raise ValueError("No data provided")
+        image_base64 = fields.get('image')
+        if not image_base64:
+            return fields, None
+        try:
+            with g.timer.stage('base64_decode'):
+                return fields, decode_base64_image(image_base64)
+        except Exception as e:
+            raise ValueError(f"Invalid image data: {str(e)}")
+    
+    if request.mimetype == 'multipart/form-data':
+        fields = request.form.to_dict()
+        upload = request.files.get('image')
+        return fields, upload.read() if upload else None
+    
+    if request.mimetype.startswith('image/'):
+        fields = request.args.to_dict()
+        if any(name in fields for name in SECRET_FIELDS):
+            raise ValueError("secret_text and encryption_key are not accepted in the query string, "
+                             "send them in the X-Secret-Text (base64) and X-Encryption-Key headers")
+        if 'X-Encryption-Key' in request.headers:
+            fields['encryption_key'] = request.headers['X-Encryption-Key']
+        if 'X-Secret-Text' in request.headers:
+            try:
+                fields['secret_text'] = base64.b64decode(request.headers['X-Secret-Text'], validate=True).decode('utf-8')
+            except (binascii.Error, UnicodeDecodeError):
+                raise ValueError("X-Secret-Text must be base64-encoded UTF-8")
+        return fields, request.get_data() or None
+    
+    raise ValueError("Request must be JSON, multipart/form-data or an image/* body")
+
+def read_batch_request():
+    """
+    Return (fields, items) for a JSON or multipart/form-data batch request.
+    
+    JSON bodies list their images as {"image": base64, ...} objects in "items",
+    where each object may override the shared technique, key or text. Multipart
+    bodies send every image as an "images" file part with shared form fields.
+    """
+    if request.is_json:
+        fields = request.get_json(silent=True)
+        if not fields:
+            raise ValueError("No data provided")
+        items = fields.get('items')
+        if not isinstance(items, list):
+            raise ValueError("items must be a list")
+    elif request.mimetype == 'multipart/form-data':
+        fields = request.form.to_dict()
+        items = [{'image': upload.read()} for upload in request.files.getlist('images')]
+    else:
+        raise ValueError("Request must be JSON or multipart/form-data")
+    
+    if not items:
+        raise ValueError("No items provided")
+    if len(items) > app.config['BATCH_MAX_ITEMS']:
+        raise ValueError(f"Too many items, at most {app.config['BATCH_MAX_ITEMS']} per batch")
+    return fields, items
+
+def batch_response(results):
+    """JSON summary of a batch run with per-item results"""
+    succeeded = sum(1 for result in results if result['success'])
+    return jsonify({
+        "success": True,
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded
+    })
+
+def field_flag(fields, name, default=False):
+    """Boolean request field, accepting JSON booleans and 1/true/yes strings"""
+    if fields.get(name) in (None, ''):
+        return default
+    return str(fields.get(name)).lower() in ('1', 'true', 'yes')
 
-def base64_to_image(base64_string):
-    """Convert base64 string to numpy image array using Pillow only"""
+def field_k(fields):
+    """Bits per carrier value requested with k, 1 when absent"""
     try:
-        # Handle both data URL and plain base64
-        if 'base64,' in base64_string:
-            base64_string = base64_string.split('base64,')[1]
-        
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(BytesIO(image_data))
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-            
-        # Convert to numpy array
-        return np.array(image)
-    except Exception as e:
-        print(f"Error converting base64 to image: {e}")
-        raise
+        return framing.check_k(fields.get('k') or 1)
+    except (TypeError, ValueError):
+        raise ValueError(f"k must be between {framing.MIN_K} and {framing.MAX_K}")
 
-def image_to_base64(image_array):
-    """Convert numpy image array to base64 string using Pillow only"""
+def field_compress(fields):
+    """Compression requested with compress: a codec name, 'auto' or 'none' (the default)"""
+    return payload_codec.resolve(fields.get('compress'))
+
+def wants_async(fields):
+    """True when the client asked for the work to run as a background job"""
+    if str(fields.get('mode', '')).lower() == 'async':
+        return True
+    return field_flag(fields, 'async')
+
+def submit_job(kind, item):
+    """Queue a background job and answer 202 with its id, or 429 when the queue is full"""
     try:
-        # Convert numpy array to PIL Image
-        image = Image.fromarray(image_array.astype('uint8'))
-        
-        # Convert to bytes
-        buffered = BytesIO()
-        image.save(buffered, format="PNG", optimize=True)
-        
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
-    except Exception as e:
-        print(f"Error converting image to base64: {e}")
-        raise
+        job_id = jobs.get_queue().submit(kind, item)
+    except jobs.QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    
+    status_url = url_for('job_status', job_id=job_id)
+    response = jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": jobs.QUEUED,
+        "status_url": status_url
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+def admit(technique, operation, header, payload_bytes=0):
+    """
+    Wait for admission of a request on a cover with this header (width, height,
+    channels, bits). Returns None once admitted, or the 413/503 response to send.
+    """
+    if not admission.controller.enabled:
+        return None
+    width, height, channels, bits = header
+    cost = admission.estimate(technique, operation, width, height, channels, bits,
+                              payload_bytes, request.content_length or 0)
+    try:
+        with g.timer.stage('admission'):
+            g.admission = admission.controller.acquire(technique, cost)
+    except admission.Rejected as e:
+        logger.warning("Request not admitted: %s", e)
+        response = jsonify({"error": str(e)})
+        response.status_code = e.status
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return None
+
+def wants_binary_response(fields, mimetype='image/png'):
+    """True when the client asked for a raw binary body instead of JSON"""
+    if str(fields.get('response', '')).lower() == 'binary':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', mimetype]) == mimetype
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -115,93 +262,299 @@ def health_check():
         "message": "Steganography API is running",
         "version": "1.0.0",
         "python_version": sys.version,
-        "cors": "enabled"  # Added to verify CORS is working
+        "cors": "enabled",  # Added to verify CORS is working
+        "kdf_cache": kdf.key_cache.stats(),
+        "extract_cache": result_cache.extract_cache.stats(),
+        "jobs": jobs.get_queue().stats(),
+        "admission": admission.controller.stats()
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Request and per-stage latency histograms in the Prometheus text format
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/hide', methods=['POST'])
 def hide_data():
     """
     Hide secret data in an image using selected technique
     """
     try:
-        print("📨 Received hide request")
-        
-        if not request.is_json:
-            return jsonify({"error": "Request must be JSON"}), 400
-            
-        data = request.get_json()
+        logger.debug("Received hide request")
         
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
+        try:
+            data, image_data = read_request_data()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         technique = data.get('technique', 'lsb').lower()
-        image_base64 = data.get('image')
         secret_text = data.get('secret_text', '')
         encryption_key = data.get('encryption_key', '')
         
-        print(f"🔧 Technique: {technique}, Text length: {len(secret_text)}")
+        # Multipart requests may hide a binary file instead of text
+        secret_file = request.files.get('secret_file')
+        
+        logger.debug("Technique: %s, Text length: %d", technique, len(secret_text))
         
         # Validate inputs
-        if not image_base64:
+        if not image_data:
             return jsonify({"error": "No image provided"}), 400
         
-        if not secret_text:
+        if not secret_text and not secret_file:
             return jsonify({"error": "No secret text provided"}), 400
         
-        if technique != 'lsb' and not encryption_key:
+        try:
+            stego = engines.get_engine(technique)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        g.timer.technique = technique
+        
+        if stego.requires_key and not encryption_key:
             return jsonify({"error": "Encryption key required for this technique"}), 400
         
-        # Convert base64 to image
+        # Keyed scatter spreads the payload over positions picked by the key
+        scatter = field_flag(data, 'scatter')
+        if scatter and not encryption_key:
+            return jsonify({"error": "Scatter mode needs a key"}), 400
+        
         try:
-            image_array = base64_to_image(image_base64)
-            print(f"🖼️ Image loaded: {image_array.shape}")
+            k = field_k(data)
+            codec = field_compress(data)
+            png_profile = resolve_png_profile(data.get('png_profile'), app.config['PNG_PROFILE'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Read the image header only, so oversized payloads fail before decoding
+        try:
+            header = capacity.read_image_header(image_data)
+            width, height, channels, _ = header
         except Exception as e:
-            print(f"❌ Error loading image: {e}")
+            logger.warning("Error loading image: %s", e)
             return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
         
-        # Process based on technique
         try:
-            if technique == 'lsb':
-                stego = LSBSteganography()
-                result_image = stego.hide_data(image_array, secret_text)
-            
-            elif technique == 'xor':
-                stego = XORSteganography()
-                result_image = stego.hide_data(image_array, secret_text, encryption_key)
-            
-            elif technique == 'aes':
-                stego = AESSteganography()
-                result_image = stego.hide_data(image_array, secret_text, encryption_key)
-            
+            with g.timer.stage('capacity_check'):
+                if secret_file:
+                    secret_file.stream.seek(0, os.SEEK_END)
+                    payload_size = secret_file.stream.tell()
+                    secret_file.stream.seek(0)
+                    # Files are not compressed twice: 'auto' decides from a sample, and a
+                    # compressed file that turns out too large fails when it is embedded
+                    if codec == payload_codec.AUTO:
+                        codec = payload_codec.choose(secret_file.stream.read(payload_codec.SAMPLE_BYTES))
+                        secret_file.stream.seek(0)
+                    if codec == framing.CODEC_NONE:
+                        capacity.check_fits_size(width, height, technique, payload_size, k, channels)
+                else:
+                    payload_size = capacity.payload_size(technique, secret_text)
+                    codec, embedded_size, flags = capacity.compressed_payload(technique, secret_text, codec)
+                    capacity.check_fits_size(width, height, technique, embedded_size, k, channels, codec, flags)
+        except ValueError as e:
+            logger.info("Capacity check failed: %s", e)
+            return jsonify({"error": str(e)}), 400
+        
+        # Async requests hand everything after validation to the job queue
+        if wants_async(data):
+            item = {
+                'image': image_data,
+                'technique': technique,
+                'encryption_key': encryption_key,
+                'png_profile': png_profile,
+                'scatter': scatter,
+                'k': k,
+                'compress': codec
+            }
+            if secret_file:
+                item['secret_data'] = secret_file.stream.read()
             else:
-                return jsonify({"error": "Invalid technique specified"}), 400
-            
-            print("✅ Data hidden successfully")
+                item['secret_text'] = secret_text
+            return submit_job('hide', item)
+        
+        # Hold back requests the memory and concurrency budgets cannot take yet
+        rejected = admit(technique, 'hide', header, payload_size)
+        if rejected is not None:
+            return rejected
+        
+        # Convert image bytes to pixels
+        try:
+            with g.timer.stage('image_decode'):
+                image_array = bytes_to_image(image_data)
+            logger.debug("Image loaded: %s", image_array.shape)
+        except Exception as e:
+            logger.warning("Error loading image: %s", e)
+            return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
+        
+        # The decoded array belongs to this request, so embed into it in
+        # place rather than copying it again
+        try:
+            payload = secret_file.stream if secret_file else secret_text
+            with g.timer.stage('embed'):
+                result_image = stego.hide(image_array, payload, encryption_key, inplace=True, scatter=scatter, k=k, codec=codec)
+            metrics.count_payload(technique, 'hide', payload_size)
+            logger.debug("Data hidden successfully")
             
+        except ValueError as e:
+            logger.info("Embedding rejected: %s", e)
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
-            print(f"❌ Error during steganography: {e}")
-            traceback.print_exc()
+            logger.exception("Error during steganography: %s", e)
             return jsonify({"error": f"Steganography failed: {str(e)}"}), 500
         
-        # Convert result to base64
+        image_size = f"{result_image.shape[1]}x{result_image.shape[0]}"
+        
         try:
-            result_base64 = image_to_base64(result_image)
-            print("✅ Image converted to base64")
+            with g.timer.stage('png_encode'):
+                png_bytes, encode_stats = encode_png(result_image, png_profile)
+            logger.debug("Image encoded: %d bytes in %s ms", encode_stats['encoded_size'], encode_stats['encode_time_ms'])
         except Exception as e:
-            print(f"❌ Error converting result image: {e}")
+            logger.exception("Error converting result image: %s", e)
             return jsonify({"error": f"Result conversion failed: {str(e)}"}), 500
         
+        # Stream the PNG back as-is when the client asked for binary output
+        if wants_binary_response(data):
+            response = send_file(BytesIO(png_bytes), mimetype='image/png', download_name='stego.png')
+            response.headers['X-Stego-Technique'] = technique
+            response.headers['X-Image-Size'] = image_size
+            response.headers['X-Stego-K'] = str(k)
+            response.headers['X-Stego-Compression'] = payload_codec.NAMES[codec]
+            response.headers['X-PNG-Profile'] = encode_stats['png_profile']
+            response.headers['X-Encoded-Size'] = str(encode_stats['encoded_size'])
+            response.headers['X-Encode-Time-Ms'] = str(encode_stats['encode_time_ms'])
+            return response
+        
+        with g.timer.stage('base64_encode'):
+            result_base64 = base64.b64encode(png_bytes).decode('utf-8')
+        
         return jsonify({
             "success": True,
             "message": "Data hidden successfully",
             "stego_image": result_base64,
             "technique": technique,
-            "image_size": f"{result_image.shape[1]}x{result_image.shape[0]}"
+            "image_size": image_size,
+            "k": k,
+            "compression": payload_codec.NAMES[codec],
+            **encode_stats
+        })
+        
+    except Exception as e:
+        logger.exception("Unexpected error in hide_data: %s", e)
+        return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+
+@app.route('/api/update', methods=['POST'])
+def update_data():
+    """
+    Replace the hidden message of a stego PNG, rewriting only the rows it occupies
+    """
+    try:
+        try:
+            data, image_data = read_request_data()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        technique = data.get('technique', 'lsb').lower()
+        secret_text = data.get('secret_text', '')
+        encryption_key = data.get('encryption_key', '')
+        secret_file = request.files.get('secret_file')
+        
+        if not image_data:
+            return jsonify({"error": "No image provided"}), 400
+        
+        if not secret_text and not secret_file:
+            return jsonify({"error": "No secret text provided"}), 400
+        
+        try:
+            stego = engines.get_engine(technique)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        g.timer.technique = technique
+        
+        if stego.requires_key and not encryption_key:
+            return jsonify({"error": "Encryption key required for this technique"}), 400
+        
+        # Scatter mode spreads the payload over the whole image, so it is always a full re-encode
+        scatter = field_flag(data, 'scatter')
+        if scatter and not encryption_key:
+            return jsonify({"error": "Scatter mode needs a key"}), 400
+        
+        try:
+            k = field_k(data)
+            codec = field_compress(data)
+            png_profile = resolve_png_profile(data.get('png_profile'), app.config['PNG_PROFILE'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        try:
+            header = capacity.read_image_header(image_data)
+            width, height, channels, bits = header
+        except Exception as e:
+            logger.warning("Error loading image: %s", e)
+            return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
+        
+        # Updates are sized in memory: the payload is needed whole to size the rewritten rows
+        payload = secret_file.read() if secret_file else secret_text
+        try:
+            with g.timer.stage('capacity_check'):
+                payload_size = len(payload) if secret_file else capacity.payload_size(technique, secret_text)
+                codec, embedded_size, flags = capacity.compressed_payload(technique, payload, codec)
+                capacity.check_fits_size(width, height, technique, embedded_size, k, channels, codec, flags)
+        except ValueError as e:
+            logger.info("Capacity check failed: %s", e)
+            return jsonify({"error": str(e)}), 400
+        
+        # An image split by an earlier update only has its window rows rewritten
+        rows = None if scatter else png_update.window_rows(image_data)
+        rejected = admit(technique, 'update', (width, rows or height, channels, bits), payload_size)
+        if rejected is not None:
+            return rejected
+        
+        try:
+            with g.timer.stage('update'):
+                png_bytes, encode_stats = png_update.update(
+                    image_data, payload, technique, encryption_key, k=k, codec=codec,
+                    png_profile=png_profile, scatter=scatter
+                )
+            metrics.count_payload(technique, 'update', payload_size)
+            logger.debug("Message updated (%s, %d rows rewritten)",
+                         encode_stats['update_mode'], encode_stats['rows_rewritten'])
+        except ValueError as e:
+            logger.info("Update rejected: %s", e)
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.exception("Error during update: %s", e)
+            return jsonify({"error": f"Update failed: {str(e)}"}), 500
+        
+        image_size = f"{width}x{height}"
+        
+        if wants_binary_response(data):
+            response = send_file(BytesIO(png_bytes), mimetype='image/png', download_name='stego.png')
+            response.headers['X-Stego-Technique'] = technique
+            response.headers['X-Image-Size'] = image_size
+            response.headers['X-Stego-K'] = str(k)
+            response.headers['X-Stego-Compression'] = payload_codec.NAMES[codec]
+            response.headers['X-Stego-Update-Mode'] = encode_stats['update_mode']
+            response.headers['X-PNG-Profile'] = encode_stats['png_profile']
+            response.headers['X-Encoded-Size'] = str(encode_stats['encoded_size'])
+            response.headers['X-Encode-Time-Ms'] = str(encode_stats['encode_time_ms'])
+            return response
+        
+        with g.timer.stage('base64_encode'):
+            result_base64 = base64.b64encode(png_bytes).decode('utf-8')
+        
+        return jsonify({
+            "success": True,
+            "message": "Message updated successfully",
+            "stego_image": result_base64,
+            "technique": technique,
+            "image_size": image_size,
+            "k": k,
+            "compression": payload_codec.NAMES[codec],
+            **encode_stats
         })
         
     except Exception as e:
-        print(f"❌ Unexpected error in hide_data: {e}")
-        traceback.print_exc()
+        logger.exception("Unexpected error in update_data: %s", e)
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
 
 @app.route('/api/extract', methods=['POST'])
@@ -210,82 +563,332 @@ def extract_data():
     Extract hidden data from an image
     """
     try:
-        print("📨 Received extract request")
+        logger.debug("Received extract request")
         
-        if not request.is_json:
-            return jsonify({"error": "Request must be JSON"}), 400
-            
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
+        try:
+            data, image_data = read_request_data()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         technique = data.get('technique', 'lsb').lower()
-        image_base64 = data.get('image')
         encryption_key = data.get('encryption_key', '')
         
-        print(f"🔧 Technique: {technique}")
+        logger.debug("Technique: %s", technique)
         
         # Validate inputs
-        if not image_base64:
+        if not image_data:
             return jsonify({"error": "No image provided"}), 400
         
-        if technique != 'lsb' and not encryption_key:
+        try:
+            stego = engines.get_engine(technique)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        g.timer.technique = technique
+        
+        if stego.requires_key and not encryption_key:
             return jsonify({"error": "Encryption key required for this technique"}), 400
         
-        # Convert base64 to image
-        try:
-            image_array = base64_to_image(image_base64)
-            print(f"🖼️ Image loaded: {image_array.shape}")
-        except Exception as e:
-            print(f"❌ Error loading image: {e}")
-            return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
+        scatter = field_flag(data, 'scatter')
+        if scatter and not encryption_key:
+            return jsonify({"error": "Scatter mode needs a key"}), 400
         
-        # Extract based on technique
-        try:
-            if technique == 'lsb':
-                stego = LSBSteganography()
-                extracted_text = stego.extract_data(image_array)
-            
-            elif technique == 'xor':
-                stego = XORSteganography()
-                extracted_text = stego.extract_data(image_array, encryption_key)
-            
-            elif technique == 'aes':
-                stego = AESSteganography()
-                extracted_text = stego.extract_data(image_array, encryption_key)
+        binary = wants_binary_response(data, 'application/octet-stream')
+        
+        # Repeated requests for the same image and key are answered from the
+        # result cache without decoding the image
+        cache = result_cache.extract_cache
+        cache_key = None
+        extracted = None
+        if cache.enabled:
+            with g.timer.stage('cache_lookup'):
+                keyed = stego.requires_key or scatter
+                cache_key = cache.make_key(image_data, technique, encryption_key if keyed else '', binary, scatter)
+                extracted = cache.get(cache_key)
+        cache_status = 'miss' if extracted is None else 'hit'
+        
+        if extracted is None and wants_async(data) and not binary:
+            return submit_job('extract', {
+                'image': image_data,
+                'technique': technique,
+                'encryption_key': encryption_key,
+                'scatter': scatter
+            })
+        
+        if extracted is None:
+            try:
+                header = capacity.read_image_header(image_data)
+            except Exception as e:
+                logger.warning("Error loading image: %s", e)
+                return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
+            # A compressed payload is costed at the most it may decompress to
+            rejected = admit(technique, 'extract', header, capacity.max_extracted_bytes(*header[:3]))
+            if rejected is not None:
+                return rejected
             
-            else:
-                return jsonify({"error": "Invalid technique specified"}), 400
+            # Convert image bytes to pixels
+            try:
+                with g.timer.stage('image_decode'):
+                    image_array = bytes_to_image(image_data)
+                logger.debug("Image loaded: %s", image_array.shape)
+            except Exception as e:
+                logger.warning("Error loading image: %s", e)
+                return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
             
-            print(f"✅ Data extracted successfully: {len(extracted_text)} characters")
+            try:
+                with g.timer.stage('extract'):
+                    extracted = stego.extract(image_array, encryption_key, binary=binary, scatter=scatter)
+            except AuthenticationError as e:
+                # Wrong key or modified image, caught by the AES-GCM tag
+                logger.info("Extraction rejected: %s", e)
+                return jsonify({"error": f"Extraction failed: {str(e)}"}), 400
+            except Exception as e:
+                # Binary extraction reports corrupt payloads as client errors
+                if binary:
+                    logger.info("Error during extraction: %s", e)
+                    return jsonify({"error": f"Extraction failed: {str(e)}"}), 400
+                logger.exception("Error during extraction: %s", e)
+                return jsonify({"error": f"Extraction failed: {str(e)}"}), 500
             
-        except Exception as e:
-            print(f"❌ Error during extraction: {e}")
-            traceback.print_exc()
-            return jsonify({"error": f"Extraction failed: {str(e)}"}), 500
+            if cache_key is not None:
+                cache.put(cache_key, extracted)
+        
+        # Hidden files come back as a raw octet stream
+        if binary:
+            metrics.count_payload(technique, 'extract', len(extracted))
+            logger.debug("Data extracted successfully: %d bytes (cache %s)", len(extracted), cache_status)
+            response = send_file(BytesIO(extracted), mimetype='application/octet-stream', download_name='secret.bin')
+            response.headers['X-Stego-Technique'] = technique
+            response.headers['X-Result-Cache'] = cache_status
+            return response
+        
+        extracted_text = extracted
+        metrics.count_payload(technique, 'extract', stego.payload_size(extracted_text))
+        logger.debug("Data extracted successfully: %d characters (cache %s)", len(extracted_text), cache_status)
         
         return jsonify({
             "success": True,
             "message": "Data extracted successfully",
             "extracted_text": extracted_text,
             "technique": technique,
-            "text_length": len(extracted_text)
+            "text_length": len(extracted_text),
+            "cache": cache_status
         })
         
     except Exception as e:
-        print(f"❌ Unexpected error in extract_data: {e}")
-        traceback.print_exc()
+        logger.exception("Unexpected error in extract_data: %s", e)
         return jsonify({"error": f"Extraction failed: {str(e)}"}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Status of a background job, with its result once it is done
+    """
+    queue = jobs.get_queue()
+    record = queue.get(job_id)
+    if record is None:
+        return jsonify({"error": "Job not found or expired"}), 404
+    
+    if record['status'] == jobs.DONE and record['kind'] == 'hide':
+        png_bytes = queue.result_image(job_id)
+        if png_bytes is None:
+            return jsonify({"error": "Job result is no longer available"}), 404
+        if wants_binary_response(request.args):
+            response = send_file(BytesIO(png_bytes), mimetype='image/png', download_name='stego.png')
+            response.headers['X-Stego-Technique'] = record['technique']
+            return response
+        record['result']['stego_image'] = base64.b64encode(png_bytes).decode('utf-8')
+    
+    return jsonify({"success": True, **record})
+
+@app.route('/api/capacity', methods=['POST'])
+def capacity_check():
+    """
+    Report how many payload bytes an image can carry for each technique
+    """
+    try:
+        logger.debug("Received capacity request")
+        
+        try:
+            data, image_data = read_request_data()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        technique = data.get('technique')
+        secret_text = data.get('secret_text')
+        
+        if not image_data:
+            return jsonify({"error": "No image provided"}), 400
+        
+        try:
+            codec = field_compress(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if technique is not None:
+            technique = technique.lower()
+            if technique not in engines.techniques():
+                return jsonify({"error": "Invalid technique specified"}), 400
+        
+        # Only the image header is parsed, pixels are never decoded
+        try:
+            with g.timer.stage('capacity_check'):
+                plans = capacity.image_capacity(image_data, [technique] if technique else None)
+        except Exception as e:
+            logger.warning("Error reading image header: %s", e)
+            return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
+        
+        result = {}
+        for name, plan in plans.items():
+            entry = plan._asdict()
+            # Every k-LSB mode, so clients can trade capacity against PSNR
+            entry['modes'] = [
+                {
+                    "k": k,
+                    "max_payload_bytes": mode.max_payload_bytes,
+                    "expected_psnr_db": mode.expected_psnr_db
+                }
+                for k in range(framing.MIN_K, framing.MAX_K + 1)
+                for mode in [capacity.plan_capacity(plan.width, plan.height, name, plan.channels, k, plan.bits_per_sample)]
+            ]
+            if secret_text is not None:
+                # With compress, requirements count compressed bytes; compressed or UTF-8 text also needs the frame prefix
+                codec_id, entry['required_bytes'], flags = capacity.compressed_payload(name, secret_text, codec)
+                entry['compression'] = payload_codec.NAMES[codec_id]
+                limits = {
+                    k: capacity.plan_capacity(plan.width, plan.height, name, plan.channels, k,
+                                              plan.bits_per_sample, codec_id, flags).max_payload_bytes
+                    for k in range(framing.MIN_K, framing.MAX_K + 1)
+                }
+                entry['fits'] = entry['required_bytes'] <= limits[plan.k]
+                entry['min_k'] = next((k for k, limit in limits.items() if entry['required_bytes'] <= limit), None)
+            result[name] = entry
+        
+        plan = next(iter(plans.values()))
+        return jsonify({
+            "success": True,
+            "image_size": f"{plan.width}x{plan.height}",
+            "capacity": result
+        })
+        
+    except Exception as e:
+        logger.exception("Unexpected error in capacity_check: %s", e)
+        return jsonify({"error": f"Capacity check failed: {str(e)}"}), 500
+
+@app.route('/api/detect', methods=['POST'])
+def detect_data():
+    """
+    Score how likely an image carries a hidden payload, from its top rows only
+    """
+    try:
+        logger.debug("Received detect request")
+        
+        try:
+            data, image_data = read_request_data()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if not image_data:
+            return jsonify({"error": "No image provided"}), 400
+        
+        technique = data.get('technique')
+        if technique:
+            technique = technique.lower()
+            if technique not in engines.techniques():
+                return jsonify({"error": "Invalid technique specified"}), 400
+            g.timer.technique = technique
+        
+        try:
+            with g.timer.stage('detect'):
+                result = detect.detect(
+                    image_data,
+                    technique=technique,
+                    encryption_key=data.get('encryption_key', ''),
+                    run_chi_square=field_flag(data, 'chi_square', default=True)
+                )
+        except Exception as e:
+            logger.warning("Error reading image: %s", e)
+            return jsonify({"error": f"Invalid image data: {str(e)}"}), 400
+        
+        return jsonify({"success": True, **result})
+        
+    except Exception as e:
+        logger.exception("Unexpected error in detect_data: %s", e)
+        return jsonify({"error": f"Detection failed: {str(e)}"}), 500
+
+@app.route('/api/batch/hide', methods=['POST'])
+def batch_hide_data():
+    """
+    Hide secret data in many images in one request, on the worker pool
+    """
+    try:
+        logger.debug("Received batch hide request")
+        
+        try:
+            data, items = read_batch_request()
+            png_profile = resolve_png_profile(data.get('png_profile'), app.config['PNG_PROFILE'])
+            k = field_k(data)
+            codec = field_compress(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        with g.timer.stage('batch_hide'):
+            results = batch.batch_hide(
+                items,
+                technique=data.get('technique', 'lsb'),
+                secret_text=data.get('secret_text', ''),
+                encryption_key=data.get('encryption_key', ''),
+                png_profile=png_profile,
+                scatter=field_flag(data, 'scatter'),
+                k=k,
+                compress=codec
+            )
+        
+        with g.timer.stage('base64_encode'):
+            for result in results:
+                if result['success']:
+                    result['stego_image'] = base64.b64encode(result['stego_image']).decode('utf-8')
+        
+        logger.info("Batch hide finished: %d items", len(results))
+        return batch_response(results)
+        
+    except Exception as e:
+        logger.exception("Unexpected error in batch_hide_data: %s", e)
+        return jsonify({"error": f"Batch processing failed: {str(e)}"}), 500
+
+@app.route('/api/batch/extract', methods=['POST'])
+def batch_extract_data():
+    """
+    Extract hidden data from many images in one request, on the worker pool
+    """
+    try:
+        logger.debug("Received batch extract request")
+        
+        try:
+            data, items = read_batch_request()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        with g.timer.stage('batch_extract'):
+            results = batch.batch_extract(
+                items,
+                technique=data.get('technique', 'lsb'),
+                encryption_key=data.get('encryption_key', ''),
+                scatter=field_flag(data, 'scatter')
+            )
+        
+        logger.info("Batch extract finished: %d items", len(results))
+        return batch_response(results)
+        
+    except Exception as e:
+        logger.exception("Unexpected error in batch_extract_data: %s", e)
+        return jsonify({"error": f"Batch extraction failed: {str(e)}"}), 500
+
 # Single main block
 if __name__ == '__main__':
-    print("🚀 Starting Steganography API Server...")
-    print(f"🐍 Python version: {sys.version}")
-    print("📊 Available endpoints:")
-    print("   GET  /api/health")
-    print("   POST /api/hide")
-    print("   POST /api/extract")
+    logger.info("Starting Steganography API Server...")
+    logger.info("Python version: %s", sys.version)
+    logger.info("Available endpoints: GET /api/health, GET /api/metrics, POST /api/hide, "
+                "POST /api/extract, GET /api/jobs/<id>, POST /api/capacity, POST /api/detect, POST /api/batch/hide, POST /api/batch/extract")
     
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import capacity
+import engines
+import frame as framing
+import payload_codec
+from image_io import bytes_to_image, decode_base64_image, encode_png
+
+# Pool size defaults to one worker process per core (gunicorn.conf.py gives
+# each server worker its share instead)
+DEFAULT_WORKERS = int(os.environ.get('BATCH_WORKERS', 0)) or os.cpu_count() or 1
+
+# Pools are started from threaded server workers, where forking can copy a
+# lock some other thread holds, so pool processes start fresh by default
+START_METHOD = os.environ.get('BATCH_START_METHOD', 'spawn')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def new_pool(workers=DEFAULT_WORKERS):
+    """Process pool whose processes start with START_METHOD"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD))
+
+
+def get_pool():
+    """Shared process pool, created on first use so it is never inherited by a fork"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = new_pool()
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _flag(value):
+    """Item flags may arrive as JSON booleans or form strings"""
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _prepare(item):
+    """Normalise an item into (engine, image_data, encryption_key)"""
+    stego = engines.get_engine(item.get('technique') or 'lsb')
+    encryption_key = item.get('encryption_key') or ''
+
+    if stego.requires_key and not encryption_key:
+        raise ValueError("Encryption key required for this technique")
+
+    image_data = item.get('image')
+    if not image_data:
+        raise ValueError("No image provided")
+    if isinstance(image_data, str):
+        image_data = decode_base64_image(image_data)
+
+    return stego, image_data, encryption_key
+
+
+def hide_item(item):
+    """Hide secret_text (or secret_data bytes) in one image; errors are returned, never raised"""
+    try:
+        stego, image_data, encryption_key = _prepare(item)
+        secret = item.get('secret_data') or item.get('secret_text') or ''
+        if not secret:
+            raise ValueError("No secret text provided")
+
+        k = framing.check_k(item.get('k') or 1)
+
+        # Fail on capacity before the pixels are decoded ('auto' compression is resolved here)
+        width, height, channels, _ = capacity.read_image_header(image_data)
+        codec, needed, flags = capacity.compressed_payload(stego.name, secret, item.get('compress'))
+        capacity.check_fits_size(width, height, stego.name, needed, k, channels, codec, flags)
+
+        image_array = bytes_to_image(image_data)
+        result_image = stego.hide(image_array, secret, encryption_key, inplace=True,
+                                  scatter=_flag(item.get('scatter')), k=k, codec=codec)
+
+        png_bytes, encode_stats = encode_png(result_image, item.get('png_profile'))
+        return {
+            "success": True,
+            "stego_image": png_bytes,
+            "technique": stego.name,
+            "image_size": f"{width}x{height}",
+            "k": k,
+            "compression": payload_codec.NAMES[codec],
+            **encode_stats
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def extract_item(item):
+    """Extract the hidden text from one image; errors are returned, never raised"""
+    try:
+        stego, image_data, encryption_key = _prepare(item)
+
+        image_array = bytes_to_image(image_data)
+        extracted_text = stego.extract(image_array, encryption_key, scatter=_flag(item.get('scatter')))
+
+        return {
+            "success": True,
+            "extracted_text": extracted_text,
+            "technique": stego.name,
+            "text_length": len(extracted_text)
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def run_batch(func, items, workers=None):
+    """
+    Run func over items on the worker pool and return results in input order.
+
+    Every result carries its "index". A worker crash only fails the items it
+    was running, the rest of the batch still completes.
+    """
+    items = list(items)
+    if workers == 1 or len(items) <= 1:
+        results = [func(item) for item in items]
+    else:
+        if workers:
+            pool = new_pool(workers)
+        else:
+            pool = get_pool()
+
+        try:
+            futures = [pool.submit(func, item) for item in items]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool as e:
+                    if pool is _pool:
+                        _reset_pool()
+                    results.append({"success": False, "error": f"Worker failed: {str(e)}"})
+                except Exception as e:
+                    results.append({"success": False, "error": f"Worker failed: {str(e)}"})
+        finally:
+            if workers:
+                pool.shutdown()
+
+    for index, result in enumerate(results):
+        result['index'] = index
+    return results
+
+
+def _merge(items, shared):
+    """Per-item settings override the shared ones; bare bytes/str items are images"""
+    merged = []
+    for item in items:
+        if not isinstance(item, dict):
+            item = {'image': item}
+        merged.append({**shared, **{k: v for k, v in item.items() if v is not None}})
+    return merged
+
+
+def batch_hide(items, technique='lsb', secret_text='', encryption_key='', png_profile=None, workers=None, scatter=False, k=1,
+               compress=None):
+    """Hide text in many images, with shared settings overridable per item"""
+    shared = {
+        'technique': technique,
+        'secret_text': secret_text,
+        'encryption_key': encryption_key,
+        'png_profile': png_profile,
+        'scatter': scatter,
+        'k': k,
+        'compress': compress,
+    }
+    return run_batch(hide_item, _merge(items, shared), workers)
+
+
+def batch_extract(items, technique='lsb', encryption_key='', workers=None, scatter=False):
+    """Extract text from many images, with shared settings overridable per item"""
+    shared = {
+        'technique': technique,
+        'encryption_key': encryption_key,
+        'scatter': scatter,
+    }
+    return run_batch(extract_item, _merge(items, shared), workers)
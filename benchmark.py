@@ -0,0 +1,210 @@
+"""
+Offline benchmark for every registered technique.
+
+Generates synthetic RGB covers and payloads from 16 bytes up to near
+capacity, then times base64 decode, PIL decode, PNG encode, and each
+technique's hide_data and extract_data on their own. Results are written as JSON so
+runs from different commits can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import base64
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+import engines
+from image_io import PNG_PROFILES, bytes_to_image, decode_base64_image, image_to_png
+
+DEFAULT_SIZES = (256, 1024, 4096)
+FIXED_PAYLOADS = (16, 1024, 64 * 1024, 1024 * 1024)
+NEAR_CAPACITY = 0.9
+BENCH_KEY = 'benchmark-key'
+
+MB = 1024 * 1024
+
+
+def make_cover(size, seed=0):
+    """Random size x size RGB cover (worst case for PNG compression)"""
+    return np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+def make_payload(size, rng):
+    """Random printable ASCII text, one byte per character for every technique"""
+    return rng.integers(32, 127, size, dtype=np.uint8).tobytes().decode('ascii')
+
+
+def payload_sizes(capacity, fixed=FIXED_PAYLOADS):
+    """Fixed payload sizes that fit, plus one near the capacity"""
+    sizes = [size for size in fixed if size <= capacity]
+    near = int(capacity * NEAR_CAPACITY)
+    if near > 0 and near not in sizes:
+        sizes.append(near)
+    return sorted(sizes)
+
+
+def measure(func, repeat):
+    """Run func repeat times; (best seconds, median seconds, peak traced bytes, last result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    # One extra traced run, so tracing overhead never skews the timings
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(timings), statistics.median(timings), peak, result
+
+
+def _record(results, stage, size, seconds, median, peak, nbytes, technique=None, payload=None, **extra):
+    row = {
+        "stage": stage,
+        "technique": technique,
+        "cover": f"{size}x{size}",
+        "payload_bytes": payload,
+        "best_ms": round(seconds * 1000, 3),
+        "median_ms": round(median * 1000, 3),
+        "throughput_mb_s": round(nbytes / MB / seconds, 2) if seconds > 0 else None,
+        "peak_mb": round(peak / MB, 3),
+    }
+    row.update(extra)
+    results.append(row)
+    return row
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, techniques=None, repeat=3, png_profiles=('fast',), progress=None):
+    """Run every stage for every cover size and technique, returning result rows"""
+    results = []
+    techniques = techniques or engines.techniques()
+    rng = np.random.default_rng(1)
+
+    def report(row):
+        if progress:
+            progress(row)
+
+    for size in sizes:
+        cover = make_cover(size)
+        raw_png = image_to_png(cover, 'fast')
+        encoded = base64.b64encode(raw_png).decode('ascii')
+
+        # Transport and codec stages, independent of the technique
+        best, median, peak, _ = measure(lambda: decode_base64_image(encoded), repeat)
+        report(_record(results, 'base64_decode', size, best, median, peak, len(encoded)))
+
+        best, median, peak, _ = measure(lambda: bytes_to_image(raw_png), repeat)
+        report(_record(results, 'pil_decode', size, best, median, peak, cover.nbytes))
+
+        for profile in png_profiles:
+            best, median, peak, png = measure(lambda: image_to_png(cover, profile), repeat)
+            report(_record(results, 'png_encode', size, best, median, peak, cover.nbytes,
+                           png_profile=profile, encoded_bytes=len(png)))
+
+        for technique in techniques:
+            stego = engines.get_engine(technique)
+            for payload_size in payload_sizes(stego.capacity(cover.shape)):
+                payload = make_payload(payload_size, rng)
+
+                best, median, peak, stego_image = measure(
+                    lambda: stego.hide(cover, payload, BENCH_KEY), repeat)
+                report(_record(results, 'hide', size, best, median, peak, payload_size,
+                               technique=technique, payload=payload_size))
+
+                best, median, peak, extracted = measure(
+                    lambda: stego.extract(stego_image, BENCH_KEY), repeat)
+                if extracted != payload:
+                    raise RuntimeError(f"{technique} round trip failed for {payload_size} bytes on {size}x{size}")
+                report(_record(results, 'extract', size, best, median, peak, payload_size,
+                               technique=technique, payload=payload_size))
+
+    return results
+
+
+def environment():
+    """Machine and code version the results were measured on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def _row_key(row):
+    return (row['stage'], row['technique'], row['cover'], row['payload_bytes'], row.get('png_profile'))
+
+
+def compare(results, baseline):
+    """Rows present in both runs with the best-time ratio (new / old, >1 is slower)"""
+    previous = {_row_key(row): row for row in baseline}
+    rows = []
+    for row in results:
+        old = previous.get(_row_key(row))
+        if old and old['best_ms']:
+            rows.append({**row, "baseline_ms": old['best_ms'], "ratio": round(row['best_ms'] / old['best_ms'], 3)})
+    return rows
+
+
+def format_row(row):
+    label = row['stage'] if not row['technique'] else f"{row['technique']} {row['stage']}"
+    payload = f" {row['payload_bytes']:>9} B" if row['payload_bytes'] is not None else ' ' * 12
+    line = (f"{label:<16}{row['cover']:>10}{payload}  {row['best_ms']:>10.2f} ms"
+            f"  {row['throughput_mb_s'] or 0:>9.2f} MB/s  {row['peak_mb']:>8.2f} MB peak")
+    if 'ratio' in row:
+        line += f"  x{row['ratio']:.2f} vs {row['baseline_ms']:.2f} ms"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every steganography technique offline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="cover edge lengths in pixels")
+    parser.add_argument('--techniques', nargs='+', default=None,
+                        help="techniques to run (default: all registered)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage")
+    parser.add_argument('--png-profiles', nargs='+', default=['fast'], choices=list(PNG_PROFILES))
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.techniques, args.repeat, args.png_profiles,
+                             progress=lambda row: print(format_row(row), file=sys.stderr))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print("\nComparison against", args.compare)
+        for row in compare(results, baseline):
+            print(format_row(row))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}", file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    main()
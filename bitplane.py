@@ -0,0 +1,334 @@
+import hashlib
+
+import numpy as np
+
+# Carrier order: every sample of the image in row-major order, all channels
+# of a pixel in turn, so grayscale carries one bit per pixel and RGBA four.
+# Every technique uses this one order.
+
+# Sample types embedded without conversion
+CARRIER_DTYPES = (np.uint8, np.uint16)
+
+# Every technique starts with a 4-byte big-endian length
+HEADER_BITS = 32
+
+# Payload bytes embedded or extracted per step by the streaming APIs
+CHUNK_SIZE = 64 * 1024
+
+
+def carrier_channels(shape):
+    """Number of channels per pixel that carry payload bits (all of them)"""
+    return shape[2] if len(shape) > 2 else 1
+
+
+def carrier_size(shape):
+    """Number of sample values available to carry one bit each"""
+    return shape[0] * shape[1] * carrier_channels(shape)
+
+
+def payload_capacity(shape):
+    """Bytes that fit after the 4-byte length header"""
+    return max(carrier_size(shape) - HEADER_BITS, 0) // 8
+
+
+def prepare_cover(image_array, inplace=False):
+    """
+    Array to embed into: one copy of the cover, or the cover itself when inplace.
+
+    uint8 and uint16 samples are kept as they are; anything else is copied
+    to uint8.
+    """
+    native = getattr(image_array, 'dtype', None) in CARRIER_DTYPES
+    if not inplace:
+        return np.array(image_array, dtype=None if native else np.uint8, copy=True)
+    if not native:
+        raise ValueError(f"In-place embedding needs a uint8 or uint16 image, got {image_array.dtype.name}")
+    return image_array
+
+
+def clear_mask(dtype, k=1):
+    """Mask that clears the k low bits of a sample of dtype"""
+    return np.dtype(dtype).type(~((1 << k) - 1) & np.iinfo(dtype).max)
+
+
+class ScatterOrder:
+    """
+    Keyed permutation of the carrier of an image, in slots of one byte.
+
+    The carrier is split into slots of 8 consecutive carrier bits, and payload
+    byte i goes to slot permute(i) instead of slot i. permute is a 4-round
+    Feistel network over the smallest even power of two covering the slots,
+    cycle-walked back into range. Slots for any run of bytes are computed as
+    one vectorized array, so embedding N bytes costs O(N) work no matter how
+    large the image is, and each slot is read or written as one 8-byte row.
+    Cycle-walking averages up to ~4 passes when the slots lie just above a
+    power of four, which leaves scattered writes 20-30x slower than
+    sequential ones for megabyte payloads (measured, see README).
+    """
+
+    ROUNDS = 4
+
+    # Round functions are precomputed as lookup tables up to this half width
+    TABLE_BITS = 20
+
+    def __init__(self, key, shape):
+        self.shape = shape
+        self.channels = carrier_channels(shape)
+        self.slots = carrier_size(shape) // 8
+
+        half = max((self.slots - 1).bit_length() + 1, 2) // 2
+        self.dtype = np.uint32 if half <= 16 else np.uint64
+        self.half_bits = self.dtype(half)
+        self.half_mask = self.dtype((1 << half) - 1)
+
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * self.ROUNDS, person=b'stego-scatter').digest()
+        self.round_keys = [np.uint64(k) for k in np.frombuffer(digest, dtype='<u8')]
+
+        # A round only sees the right half, so for realistic images every
+        # round function is a small table and a round is a single gather
+        self.tables = None
+        if half <= self.TABLE_BITS:
+            domain = np.arange(1 << half, dtype=np.uint64)
+            self.tables = [self._round(domain, key).astype(self.dtype) for key in self.round_keys]
+
+    def _round(self, right, key):
+        # splitmix64 finalizer of the keyed half, uint64 arithmetic wraps modulo 2**64
+        with np.errstate(over='ignore'):
+            z = right.astype(np.uint64) ^ key
+            z ^= z >> np.uint64(30)
+            z *= np.uint64(0xBF58476D1CE4E5B9)
+            z ^= z >> np.uint64(27)
+            z *= np.uint64(0x94D049BB133111EB)
+            z ^= z >> np.uint64(31)
+        return z & np.uint64(self.half_mask)
+
+    def _permute(self, values):
+        left = values >> self.half_bits
+        right = values & self.half_mask
+        for i, key in enumerate(self.round_keys):
+            mixed = self.tables[i][right] if self.tables is not None else self._round(right, key).astype(self.dtype)
+            left, right = right, left ^ mixed
+        return (left << self.half_bits) | right
+
+    def slot_positions(self, first, count):
+        """Slots holding payload bytes [first, first + count) as an int64 array"""
+        if first + count > self.slots:
+            raise ValueError("Image too small for the secret text")
+        slots = self._permute(np.arange(first, first + count, dtype=self.dtype))
+        # Cycle-walk values that land outside the carrier back into it
+        pending = np.flatnonzero(slots >= self.slots)
+        while pending.size:
+            slots[pending] = self._permute(slots[pending])
+            pending = pending[slots[pending] >= self.slots]
+        return slots.astype(np.int64)
+
+    def _locate(self, x, offset, count):
+        """
+        (array, index, lanes) such that array[index] holds byte-aligned carrier bits [offset, offset + count).
+
+        Contiguous images whose carrier is every sample are addressed as one
+        uint64 per slot (lanes=True, 8 samples at once); anything else is
+        indexed one carrier bit at a time.
+        """
+        slots = self.slot_positions(offset // 8, count // 8)
+
+        total = x.shape[2] if x.ndim > 2 else 1
+        if x.flags.c_contiguous and x.dtype == np.uint8 and self.channels == total:
+            return x.reshape(-1)[:self.slots * 8].view(np.uint64), slots, True
+
+        positions = (slots[:, None] * 8 + np.arange(8)).reshape(-1)
+        return self._index(x, positions) + (False,)
+
+    def _index(self, x, positions):
+        """(array, fancy index) addressing carrier positions of x"""
+        total = x.shape[2] if x.ndim > 2 else 1
+        pixel, channel = np.divmod(positions, self.channels)
+        if x.flags.c_contiguous:
+            return x.reshape(-1), pixel * total + channel
+        row, col = np.divmod(pixel, x.shape[1])
+        return x, ((row, col, channel) if x.ndim > 2 else (row, col))
+
+    def value_index(self, x, first, count):
+        """(array, fancy index) addressing carrier values [first, first + count) in scattered order"""
+        lead = first % 8
+        slots = self.slot_positions(first // 8, -(-(first + count) // 8) - first // 8)
+        positions = (slots[:, None] * 8 + np.arange(8)).reshape(-1)[lead:lead + count]
+        return self._index(x, positions)
+
+    def write(self, x, offset, bits):
+        """Write 0/1 bits for carrier bits [offset, offset + bits.size) into x"""
+        target, index, lanes = self._locate(x, offset, bits.size)
+        if lanes:
+            # The 8 bits of a slot line up with the 8 bytes of its uint64
+            target[index] = (target[index] & np.uint64(0xFEFEFEFEFEFEFEFE)) | bits.view(np.uint64)
+        else:
+            target[index] = (target[index] & clear_mask(target.dtype)) | bits
+
+    def read(self, x, offset, count):
+        """Carrier bits [offset, offset + count) of x as a 0/1 uint8 array"""
+        target, index, lanes = self._locate(x, offset, count)
+        if lanes:
+            return (target[index] & np.uint64(0x0101010101010101)).view(np.uint8)
+        return target[index] & 1
+
+
+def scatter_order(key, shape):
+    """ScatterOrder for key, or None (sequential order) when key is empty"""
+    return ScatterOrder(key, shape) if key else None
+
+
+def _rows(x, offset, count):
+    """Image rows covering carrier bits [offset, offset + count), and the bit offset within them"""
+    per_row = x.shape[1] * carrier_channels(x.shape)
+    first = offset // per_row
+    last = -(-(offset + count) // per_row)
+    return x[first:last], offset - first * per_row
+
+
+def _samples(rows):
+    """Carrier samples of rows in carrier order, a view when the rows are contiguous"""
+    # Only the touched rows are ever copied, so strided or memory-mapped
+    # images cost memory in proportion to the payload, not the image
+    return rows.reshape(-1)
+
+
+def read_values(x, first, count, order=None):
+    """Copy of carrier values [first, first + count) in carrier order"""
+    if order is not None:
+        target, index = order.value_index(x, first, count)
+        return target[index]
+    rows, start = _rows(x, first, count)
+    return _samples(rows)[start:start + count].copy()
+
+
+def write_values(x, first, values, order=None):
+    """Store values as carrier values [first, first + values.size) of x, in place"""
+    if order is not None:
+        target, index = order.value_index(x, first, values.size)
+        target[index] = values
+        return
+
+    rows, start = _rows(x, first, values.size)
+    samples = _samples(rows)
+    samples[start:start + values.size] = values
+
+    # Strided rows were copied, so write them back
+    if not np.may_share_memory(samples, rows):
+        rows[...] = samples.reshape(rows.shape)
+
+
+def _planes(offset, count, k):
+    """
+    For stream bits [offset, offset + count) stored k per carrier value, yield
+    (bit slice, first value relative to offset // k, plane) for each of the k planes.
+
+    Stream bit b lives in value b // k, MSB-first within the value's k low bits.
+    """
+    for j in range(k):
+        lead = (j - offset) % k
+        if lead >= count:
+            continue
+        yield slice(lead, count, k), (offset + lead) // k - offset // k, k - 1 - j
+
+
+def _write_planes(x, offset, bits, order, k):
+    first = offset // k
+    values = read_values(x, first, -(-(offset + bits.size) // k) - first, order)
+    for bit_slice, start, plane in _planes(offset, bits.size, k):
+        selected = bits[bit_slice]
+        segment = values[start:start + selected.size]
+        segment &= ~values.dtype.type(1 << plane)
+        segment |= selected.astype(values.dtype) << plane
+    write_values(x, first, values, order)
+
+
+def _read_planes(x, offset, count, order, k):
+    first = offset // k
+    values = read_values(x, first, -(-(offset + count) // k) - first, order)
+    bits = np.empty(count, dtype=np.uint8)
+    for bit_slice, start, plane in _planes(offset, count, k):
+        size = len(range(*bit_slice.indices(count)))
+        bits[bit_slice] = (values[start:start + size] >> plane) & 1
+    return bits
+
+
+def write_bits(x, offset, bits, order=None, k=1):
+    """
+    Write a 0/1 uint8 array into the low bit planes of x, in place.
+    
+    offset counts stream bits, k of which are stored in each carrier value
+    (k=1 is the classic LSB plane). order scatters the carrier values.
+    """
+    if -(-(offset + bits.size) // k) > carrier_size(x.shape):
+        raise ValueError("Image too small for the secret text")
+    if bits.size == 0:
+        return
+    
+    # Byte-aligned scattered runs have a faster path below
+    if k != 1 or (order is not None and (offset % 8 or bits.size % 8)):
+        _write_planes(x, offset, bits, order, k)
+        return
+    
+    if order is not None:
+        order.write(x, offset, bits)
+        return
+
+    rows, start = _rows(x, offset, bits.size)
+    samples = _samples(rows)
+    stop = start + bits.size
+    samples[start:stop] = (samples[start:stop] & clear_mask(samples.dtype)) | bits
+
+    # Strided rows were copied, so write them back
+    if not np.may_share_memory(samples, rows):
+        rows[...] = samples.reshape(rows.shape)
+
+
+def embed_bytes(x, offset, data, order=None, k=1):
+    """Embed data MSB-first into the low bit planes of x starting at stream bit offset"""
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    write_bits(x, offset, bits, order, k)
+    return offset + bits.size
+
+
+def read_bits(x, offset, count, order=None, k=1):
+    """Read count stream bits starting at bit offset as a 0/1 uint8 array"""
+    if -(-(offset + count) // k) > carrier_size(x.shape):
+        raise ValueError("Read past the end of the image")
+    
+    if k != 1 or (order is not None and (offset % 8 or count % 8)):
+        return _read_planes(x, offset, count, order, k)
+    
+    if order is not None:
+        return order.read(x, offset, count)
+
+    rows, start = _rows(x, offset, count)
+    return _samples(rows)[start:start + count] & 1
+
+
+def read_bytes(x, offset, count, order=None, k=1):
+    """Read count MSB-first bytes from the low bit planes starting at stream bit offset"""
+    bits = read_bits(x, offset, count * 8, order, k)
+    return np.packbits(bits.astype(np.uint8, copy=False)).tobytes()
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield byte chunks from bytes, a binary file-like object or an iterable of chunks"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def iter_ranges(length, chunk_size=CHUNK_SIZE):
+    """(start, count) pairs covering length bytes in chunk_size steps"""
+    for start in range(0, length, chunk_size):
+        yield start, min(chunk_size, length - start)
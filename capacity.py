@@ -0,0 +1,113 @@
+from collections import namedtuple
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image
+
+import bitplane
+import engines
+import frame as framing
+import payload_codec
+from image_io import native_mode
+
+# Covers whose mode is unknown are planned as 8-bit RGB
+CHANNELS = 3
+BITS_PER_SAMPLE = 8
+
+CapacityPlan = namedtuple('CapacityPlan', [
+    'technique',
+    'width',
+    'height',
+    'channels',         # samples per pixel in the decoded cover
+    'bits_per_sample',  # 8, or 16 for 16-bit grayscale
+    'carrier_bits',     # sample values available to carry k bits each
+    'k',                # payload bits per carrier value
+    'header_bytes',     # 4-byte length header, plus the 4-byte decompressed size with a codec
+    'overhead_bytes',   # fixed per-message cost on top of the header (AES KDF header, nonce, tag)
+    'max_payload_bytes',
+    'expected_psnr_db', # mean PSNR of a cover filled to capacity
+])
+
+
+@lru_cache(maxsize=1024)
+def plan_capacity(width, height, technique, channels=CHANNELS, k=1, bits=BITS_PER_SAMPLE, codec=framing.CODEC_NONE,
+                  flags=0):
+    """
+    Capacity breakdown for a cover of the given dimensions at k bits per carrier
+    value. With a codec, max_payload_bytes counts compressed bytes; frame flags
+    (UTF-8 text) can add the frame prefix even at k=1.
+    """
+    engine = engines.get_engine(technique)
+    frame = framing.make_frame(k, codec, flags)
+    shape = (height, width, channels)
+    max_payload = engine.capacity(shape, k, codec, flags)
+
+    # Share of all samples rewritten when the payload fills the cover
+    samples = width * height * channels
+    changed = frame.values_needed(max_payload + engine.overhead_bytes) / samples if samples else 0.0
+
+    return CapacityPlan(
+        technique=technique,
+        width=width,
+        height=height,
+        channels=channels,
+        bits_per_sample=bits,
+        carrier_bits=bitplane.carrier_size(shape),
+        k=frame.k,
+        header_bytes=frame.header_bytes,
+        overhead_bytes=engine.overhead_bytes,
+        max_payload_bytes=max_payload,
+        expected_psnr_db=round(framing.expected_psnr(frame.k, min(changed, 1.0), peak=(1 << bits) - 1), 2),
+    )
+
+
+def payload_size(technique, secret_text):
+    """Number of payload bytes the technique embeds for secret_text"""
+    return engines.get_engine(technique).payload_size(secret_text)
+
+
+def compressed_payload(technique, payload, codec):
+    """
+    (codec id, bytes embedded, frame flags) for text or bytes compressed with
+    codec, 'auto' resolved
+    """
+    flags = 0
+    if isinstance(payload, str):
+        payload, flags = engines.get_engine(technique).text_payload(payload)
+    return payload_codec.compressed_size(codec, payload) + (flags,)
+
+
+def max_extracted_bytes(width, height, channels=CHANNELS):
+    """Most payload bytes an extraction can return from a cover of these dimensions, decompression included"""
+    stored = bitplane.carrier_size((height, width, channels)) * framing.MAX_K // 8
+    return max(stored, payload_codec.output_limit(stored))
+
+
+def read_image_header(image_data):
+    """(width, height, channels, bits per sample) of the decoded cover, from the header only"""
+    # Encoded bytes, or a path to an image file
+    source = BytesIO(image_data) if isinstance(image_data, (bytes, bytearray, memoryview)) else image_data
+    with Image.open(source) as image:
+        width, height = image.size
+        mode = native_mode(image.mode, image.info)
+    return width, height, Image.getmodebands(mode), 16 if mode == 'I;16' else 8
+
+
+def check_fits_size(width, height, technique, needed, k=1, channels=CHANNELS, codec=framing.CODEC_NONE, flags=0):
+    """Raise ValueError if a payload of needed bytes (compressed with codec, framed with flags) cannot be hidden in the cover"""
+    plan = plan_capacity(width, height, technique, channels, k, codec=codec, flags=flags)
+    if needed > plan.max_payload_bytes:
+        raise ValueError(
+            f"Image too small for the secret text. Need {needed} bytes, "
+            f"{technique.upper()} capacity of a {width}x{height} image is {plan.max_payload_bytes} bytes"
+        )
+    return plan
+
+
+def image_capacity(image_data, techniques=None, k=1):
+    """Capacity plans for an encoded image, keyed by technique"""
+    width, height, channels, bits = read_image_header(image_data)
+    return {
+        technique: plan_capacity(width, height, technique, channels, k, bits)
+        for technique in (techniques or engines.techniques())
+    }
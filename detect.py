@@ -0,0 +1,166 @@
+"""
+Quick check for payloads hidden by this suite, from the top rows only.
+
+detect() decodes just the rows holding the frame prefix, the length header
+and the first payload bytes (PNGs are inflated incrementally, other formats
+are decoded in full) and scores how likely the image carries a payload:
+
+- a v2 frame prefix or an AES KDF header is a near-certain match,
+- a legacy length header whose payload starts like text is good evidence,
+- a legacy length header that merely fits the image (and, for AES, the
+  cipher layout) is weak evidence, as smooth covers often start with
+  runs of zero LSBs,
+- optionally, a chi-square test over pairs of values (2i, 2i + 1) in the
+  leading rows picks up the LSB equalisation left by sequential embedding.
+
+Weak evidence and the chi-square test only lead to a detection together.
+
+Scattered payloads are spread over the whole image and look like noise in
+the top rows, so they are not detected.
+"""
+import math
+import time
+
+import numpy as np
+
+import bitplane
+import engines
+import frame as framing
+from image_io import bytes_to_image
+from png_scanlines import PNGScanlines, UnsupportedPNG
+
+# Leading carrier values sampled for the chi-square statistic
+CHI_SQUARE_VALUES = 1 << 16
+
+# Pairs of values expected fewer times than this are left out of the statistic
+CHI_SQUARE_MIN_EXPECTED = 5
+
+# Confidence for each kind of header evidence
+FRAME_CONFIDENCE = 0.99
+LENGTH_TEXT_CONFIDENCE = 0.9
+LENGTH_CONFIDENCE = 0.4
+EVIDENCE_CONFIDENCE = {
+    'aes_header': FRAME_CONFIDENCE,
+    'length_text': LENGTH_TEXT_CONFIDENCE,
+    'length': LENGTH_CONFIDENCE
+}
+
+# Kept below DETECT_THRESHOLD: noisy covers can have even pair counts too
+CHI_SQUARE_WEIGHT = 0.45
+
+DETECT_THRESHOLD = 0.5
+
+
+def read_top_rows(image_data, values):
+    """(rows, full image shape, decoder) with enough top rows to hold values carrier values"""
+    try:
+        png = PNGScanlines(image_data)
+    except UnsupportedPNG:
+        pixels = bytes_to_image(image_data)
+        return pixels, pixels.shape, 'full'
+
+    per_row = bitplane.carrier_size(png.shape) // max(png.height, 1)
+    return png.rows(-(-values // max(per_row, 1))), png.shape, 'scanlines'
+
+
+def header_values(names):
+    """Carrier values holding the prefix, the length header and the payload start the named engines read"""
+    header_bytes = max(engines.get_engine(name).header_bytes for name in names)
+    return framing.PREFIX_VALUES + bitplane.HEADER_BITS + header_bytes * 8
+
+
+def header_evidence(rows, shape, technique, encryption_key=''):
+    """
+    (confidence, evidence, frame, payload length) for one technique, from the
+    decoded top rows of an image of the given shape.
+    """
+    try:
+        evidence, frame, length = engines.get_engine(technique).header_evidence(rows, shape, encryption_key)
+    except ValueError:
+        # The magic matched but the fields are not ours to read
+        return FRAME_CONFIDENCE, 'frame', None, None
+
+    confidence = EVIDENCE_CONFIDENCE.get(evidence, 0.0)
+    if not frame.legacy and confidence < FRAME_CONFIDENCE:
+        return FRAME_CONFIDENCE, 'frame', frame, length
+    if not confidence:
+        return 0.0, None, None, None
+    return confidence, evidence, frame, length
+
+
+def _chi_square_sf(statistic, dof):
+    """Upper tail probability of the chi-square distribution (Wilson-Hilferty approximation)"""
+    if statistic <= 0:
+        return 1.0
+    scale = 2 / (9 * dof)
+    z = ((statistic / dof) ** (1 / 3) - (1 - scale)) / math.sqrt(scale)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def chi_square(values):
+    """
+    Pairs-of-values chi-square test on a sample of carrier values.
+
+    Overwriting LSBs with payload bits evens out the counts of each pair
+    (2i, 2i + 1), so a p-value near 1 means the sample looks embedded and a
+    p-value near 0 means it looks like an untouched cover.
+    """
+    hist = np.bincount(values.reshape(-1))
+    if hist.size % 2:
+        hist = np.append(hist, 0)
+    even = hist[0::2].astype(np.float64)
+    expected = (even + hist[1::2]) / 2
+
+    used = expected >= CHI_SQUARE_MIN_EXPECTED
+    dof = int(used.sum()) - 1
+    if dof < 1:
+        return {"statistic": 0.0, "dof": 0, "p_value": 0.0, "samples": int(values.size)}
+    statistic = float((((even - expected) ** 2)[used] / expected[used]).sum())
+    return {
+        "statistic": round(statistic, 3),
+        "dof": dof,
+        "p_value": round(_chi_square_sf(statistic, dof), 6),
+        "samples": int(values.size)
+    }
+
+
+def detect(image_data, technique=None, encryption_key='', run_chi_square=True):
+    """
+    Score how likely encoded image_data carries a payload from this suite.
+
+    technique narrows the header checks to one engine; encryption_key lets
+    keyed (XOR) length headers be checked. Only the top rows are decoded.
+    """
+    start = time.perf_counter()
+    techniques = [technique] if technique else engines.techniques()
+
+    values = header_values(techniques)
+    if run_chi_square:
+        values = max(values, CHI_SQUARE_VALUES)
+    rows, shape, decoder = read_top_rows(image_data, values)
+
+    best = (0.0, None, None, None, None)
+    for name in techniques:
+        confidence, evidence, frame, length = header_evidence(rows, shape, name, encryption_key)
+        if confidence > best[0]:
+            best = (confidence, name, evidence, frame, length)
+    confidence, found, evidence, frame, length = best
+
+    chi = None
+    if run_chi_square:
+        chi = chi_square(rows.reshape(-1)[:CHI_SQUARE_VALUES])
+        confidence = 1 - (1 - confidence) * (1 - CHI_SQUARE_WEIGHT * chi['p_value'])
+
+    return {
+        "detected": confidence >= DETECT_THRESHOLD,
+        "confidence": round(confidence, 4),
+        "technique": found,
+        "evidence": evidence,
+        "frame": frame._asdict() if frame is not None else None,
+        "payload_bytes": length,
+        "chi_square": chi,
+        "decoder": decoder,
+        "rows_decoded": int(rows.shape[0]),
+        "image_size": f"{shape[1]}x{shape[0]}",
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
@@ -0,0 +1,292 @@
+import threading
+
+import numpy as np
+
+import bitplane
+import frame as framing
+import payload_codec
+
+# Engines are stateless, so one shared instance per technique serves every
+# request and thread. Each one provides name, requires_key, capacity(shape),
+# text_payload(text), payload_size(text), hide(image, payload, key, inplace)
+# and extract(image, key, binary).
+_registry = {}
+_lock = threading.Lock()
+
+# Payload bytes header_evidence() reads after the length header to judge
+# whether it starts like text, and the fewest that count as text
+SNIFF_BYTES = 16
+MIN_TEXT_BYTES = 4
+
+# Payload round-tripped through every engine by warmup()
+WARMUP_SHAPE = (64, 64, 3)
+WARMUP_TEXT = 'warmup \u2713'
+WARMUP_KEY = 'warmup'
+
+
+def _looks_like_text(data):
+    """True when every byte is printable ASCII, whitespace or a Latin-1 letter"""
+    return bool(data) and all(32 <= b < 127 or b in (9, 10, 13) or b >= 0xA0 for b in data)
+
+
+class Steganography:
+    """
+    Framing, capacity and streaming shared by every engine.
+    
+    The payload goes after the 4-byte length in the frame body. Subclasses
+    only change how it is transformed on the way in and out: _sealer() and
+    _open() (plus _mask_length() for a keyed length), and text_payload() /
+    payload_text() when text is not stored as framing.encode_text does.
+    """
+    name = None
+    requires_key = False
+    overhead_bytes = 0
+    # Payload bytes header_evidence() reads after the length header
+    header_bytes = SNIFF_BYTES
+    
+    def capacity(self, shape, k=1, codec=framing.CODEC_NONE, flags=0):
+        """Largest payload in bytes (after compression) that fits in an image of this shape at k bits per value"""
+        return framing.make_frame(k, codec, flags).payload_capacity(shape)
+    
+    def text_payload(self, secret_text):
+        """(bytes, frame flags) embedded for secret_text: one byte per character, or flagged UTF-8 beyond Latin-1"""
+        return framing.encode_text(secret_text)
+    
+    def payload_text(self, data, flags):
+        """Text of an extracted payload written by text_payload()"""
+        return framing.decode_text(data, flags)
+    
+    def encode_text(self, secret_text):
+        """Bytes embedded for secret_text"""
+        return self.text_payload(secret_text)[0]
+    
+    def payload_size(self, secret_text):
+        """Bytes embedded for secret_text"""
+        return len(self.encode_text(secret_text))
+    
+    def hide(self, image_array, payload, encryption_key='', inplace=False, scatter=False, k=1, codec=None):
+        """Common engine interface: payload is text, bytes or a chunked source"""
+        if isinstance(payload, str):
+            return self.hide_data(image_array, payload, encryption_key, inplace=inplace, scatter=scatter, k=k, codec=codec)
+        return self.hide_stream(image_array, payload, encryption_key, inplace=inplace, scatter=scatter, k=k, codec=codec)
+    
+    def extract(self, image_array, encryption_key='', binary=False, scatter=False):
+        """Common engine interface: the hidden text, or bytes when binary"""
+        if binary:
+            return self.extract_bytes(image_array, encryption_key, scatter=scatter)
+        return self.extract_data(image_array, encryption_key, scatter=scatter)
+    
+    def _sealer(self, encryption_key):
+        """
+        Start a payload, returning (prefix, seal, finish): the frame body is
+        prefix, then seal(chunk) for every chunk, then finish().
+        """
+        # Stored as is
+        return b'', bytes, bytes
+    
+    def _mask_length(self, length_bytes, encryption_key):
+        """The stored form of the 4-byte length, and back again"""
+        return length_bytes
+    
+    def _open(self, read, length, encryption_key, chunk_size):
+        """Yield the payload of a frame body of length bytes, read(start, count) returning its raw bytes"""
+        for start, count in bitplane.iter_ranges(length, chunk_size):
+            yield read(start, count)
+    
+    def _body_evidence(self, read, length, encryption_key):
+        """'length_text' when the payload starts like text, 'length' when there is one, else None"""
+        count = min(length, SNIFF_BYTES)
+        try:
+            sniffed = b''.join(self._open(read, count, encryption_key, count))
+        except ValueError:
+            # The payload starts past the decoded rows
+            sniffed = b''
+        if length >= MIN_TEXT_BYTES and _looks_like_text(sniffed):
+            return 'length_text'
+        return 'length' if length else None
+    
+    def _order(self, shape, encryption_key, scatter):
+        # The key doubles as the seed of the keyed scatter order
+        if scatter and not encryption_key:
+            raise ValueError("Scatter mode needs a key")
+        return bitplane.scatter_order(encryption_key if scatter else '', shape)
+    
+    def hide_data(self, image_array, secret_text, encryption_key='', inplace=False, scatter=False, k=1, codec=None):
+        """Hide secret_text in image"""
+        data, flags = self.text_payload(secret_text)
+        return self.hide_stream(image_array, data, encryption_key, inplace=inplace, scatter=scatter, k=k,
+                                codec=codec, flags=flags)
+    
+    def hide_bytes(self, image_array, data, encryption_key='', inplace=False, scatter=False, k=1, codec=None):
+        """Hide a binary payload in image"""
+        return self.hide_stream(image_array, data, encryption_key, inplace=inplace, scatter=scatter, k=k, codec=codec)
+    
+    def hide_stream(self, image_array, source, encryption_key='', chunk_size=bitplane.CHUNK_SIZE, inplace=False,
+                    scatter=False, k=1, codec=None, flags=0):
+        """
+        Hide a payload read in chunks from bytes, a file-like object or an iterable.
+        
+        With inplace=True the payload is written straight into image_array (which
+        may be a memory-mapped file), so only the rows carrying it are touched.
+        With scatter=True the bits go to positions picked by the key, not a prefix,
+        and k > 1 stores k bits in every carrier value. A codec (name, id or 'auto')
+        compresses the payload first and is recorded in the frame.
+        """
+        x = bitplane.prepare_cover(image_array, inplace)
+        order = self._order(x.shape, encryption_key, scatter)
+        size = 0
+        
+        def counted(chunks):
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        
+        codec, chunks = payload_codec.encode_stream(counted(bitplane.iter_chunks(source, chunk_size)), codec)
+        frame = framing.make_frame(k, codec, flags)
+        prefix, seal, finish = self._sealer(encryption_key)
+        
+        # The body goes after the length, which is written once it is known
+        offset = bitplane.embed_bytes(x, frame.body, prefix, order, frame.k)
+        for chunk in chunks:
+            offset = bitplane.embed_bytes(x, offset, seal(chunk), order, frame.k)
+        offset = bitplane.embed_bytes(x, offset, finish(), order, frame.k)
+        
+        length = (offset - frame.body) // 8
+        capacity = frame.payload_capacity(x.shape)
+        if length > capacity:
+            raise ValueError("Image too small for the secret text")
+        # Extraction refuses to inflate past this, so never write more
+        limit = payload_codec.output_limit(capacity)
+        if codec != framing.CODEC_NONE and size > limit:
+            raise ValueError(f"Payload too large: it decompresses to {size} bytes, "
+                             f"extraction from this image allows {limit}")
+        length_bytes = self._mask_length(length.to_bytes(4, byteorder='big'), encryption_key)
+        bitplane.embed_bytes(x, frame.start, length_bytes, order, frame.k)
+        framing.write_size(x, frame, size, order)
+        framing.write_prefix(x, frame, order)
+        return x
+    
+    def _read_length(self, x, frame, order, encryption_key):
+        """Body length from the header, or None if the image holds no payload"""
+        if bitplane.carrier_size(x.shape) < frame.values_needed(0):
+            return None
+        
+        length_bytes = self._mask_length(bitplane.read_bytes(x, frame.start, 4, order, frame.k), encryption_key)
+        length = int.from_bytes(length_bytes, byteorder='big')
+        
+        # A length the image cannot hold means no payload (or a wrong key)
+        if length > frame.payload_capacity(x.shape):
+            return None
+        return length
+    
+    def extract_stream(self, image_array, encryption_key='', chunk_size=bitplane.CHUNK_SIZE, scatter=False):
+        """Yield the hidden payload in chunks, decompressed when the frame records a codec"""
+        x = np.asarray(image_array)
+        order = self._order(x.shape, encryption_key, scatter)
+        frame = framing.read_frame(x, order)
+        length = self._read_length(x, frame, order, encryption_key)
+        if length is None:
+            return  # No data found
+        
+        # Checked before any key is derived or byte inflated
+        size = framing.read_size(x, frame, order)
+        limit = payload_codec.output_limit(frame.payload_capacity(x.shape))
+        if size is not None and size > limit:
+            raise ValueError(f"No hidden data found (header claims {size} decompressed bytes, "
+                             f"this image allows at most {limit})")
+        
+        def read(start, count):
+            return bitplane.read_bytes(x, frame.body + start * 8, count, order, frame.k)
+        
+        chunks = self._open(read, length, encryption_key, chunk_size)
+        try:
+            yield from payload_codec.decode_stream(frame.codec, chunks, limit, size)
+        except ValueError:
+            # A wrong key reaches the decompressor as garbage; let a transform
+            # that verifies the payload at its end report that instead
+            for _ in chunks:
+                pass
+            raise
+    
+    def header_evidence(self, rows, shape, encryption_key=''):
+        """
+        (evidence, frame, payload length) from the decoded top rows of an image
+        of shape, read in sequential order.
+        
+        evidence is what the payload looks like (see _body_evidence), or None.
+        length is None when it cannot be read (past the decoded rows, or a keyed
+        length without the key) or is more than the image holds. Raises
+        ValueError for a frame prefix it cannot parse.
+        """
+        frame = framing.read_frame(rows)
+        try:
+            length_bytes = self._mask_length(bitplane.read_bytes(rows, frame.start, 4, None, frame.k), encryption_key)
+        except ValueError:
+            return None, frame, None
+        length = int.from_bytes(length_bytes, byteorder='big')
+        if length > frame.payload_capacity(shape):
+            return None, frame, None
+        
+        def read(start, count):
+            return bitplane.read_bytes(rows, frame.body + start * 8, count, None, frame.k)
+        
+        return self._body_evidence(read, length, encryption_key), frame, length
+    
+    def extract_bytes(self, image_array, encryption_key='', scatter=False):
+        """Extract the hidden payload as bytes"""
+        return b''.join(self.extract_stream(image_array, encryption_key, scatter=scatter))
+    
+    def extract_data(self, image_array, encryption_key='', scatter=False):
+        """Extract the hidden text"""
+        x = np.asarray(image_array)
+        frame = framing.read_frame(x, self._order(x.shape, encryption_key, scatter))
+        return self.payload_text(self.extract_bytes(x, encryption_key, scatter=scatter), frame.flags)
+
+
+def register(engine, name=None):
+    """Add or replace a technique; name defaults to engine.name"""
+    name = (name or engine.name).lower()
+    with _lock:
+        _registry[name] = engine
+    return engine
+
+
+def get_engine(technique):
+    """Shared engine for a technique name, ValueError if it is unknown"""
+    engine = _registry.get((technique or '').lower())
+    if engine is None:
+        raise ValueError("Invalid technique specified")
+    return engine
+
+
+def techniques():
+    """Names of all registered techniques"""
+    return tuple(_registry)
+
+
+def warmup(shape=WARMUP_SHAPE):
+    """
+    Hide and extract a short payload with every engine, sequentially and in
+    scatter/k-LSB mode, so the numpy paths are exercised before the first
+    request. Raises RuntimeError naming the engine that failed, which makes a
+    broken install a startup error rather than a failure on every request.
+    """
+    if not _registry:
+        raise RuntimeError("No steganography engines registered")
+    cover = np.zeros(shape, dtype=np.uint8)
+    for name, engine in list(_registry.items()):
+        try:
+            for k, scatter in ((1, False), (2, True)):
+                stego = engine.hide(cover, WARMUP_TEXT, WARMUP_KEY, scatter=scatter, k=k)
+                if engine.extract(stego, WARMUP_KEY, scatter=scatter) != WARMUP_TEXT:
+                    raise ValueError("extracted payload does not match")
+        except Exception as e:
+            raise RuntimeError(f"Engine '{name}' failed its startup self-test: {e}") from e
+    return techniques()
+
+
+# The built-in engines subclass Steganography and register themselves
+import lsb_steganography
+import xor_steganography
+import aes_steganography
@@ -0,0 +1,170 @@
+"""
+Versioned payload frame shared by every technique.
+
+Legacy images start directly with the 4-byte length header at one bit per
+carrier value. Images that need more than that (k-LSB, compression, text
+encoding flags) start with an 8-byte prefix written at one bit per value in
+the clear, so extraction can detect the settings before reading on:
+
+    magic (4) | version (1) | k (1) | codec (1) | flags (1)
+
+The length header and payload follow at k bits per carrier value, with the
+4-byte decompressed size in between when the payload is compressed
+(FLAG_SIZE). The magic starts with 0xFF, a length no legacy image can hold,
+so the two never clash.
+"""
+import math
+import struct
+from collections import namedtuple
+
+import bitplane
+
+MAGIC = b'\xffSTG'
+VERSION = 2
+PREFIX = struct.Struct('>4sBBBB')
+
+# Carrier values taken by the prefix (one bit each)
+PREFIX_VALUES = PREFIX.size * 8
+
+MIN_K = 1
+MAX_K = 4
+
+# Codec ids
+CODEC_NONE = 0
+
+# Flags: text payloads are Latin-1, one byte per character, unless FLAG_UTF8 is set
+FLAG_UTF8 = 0x01
+# The length header is followed by the decompressed size of the payload (set
+# with every codec; older compressed images lack it)
+FLAG_SIZE = 0x02
+SIZE_BITS = 32
+
+
+class Frame(namedtuple('Frame', ['version', 'k', 'codec', 'flags'])):
+    """Layout of one embedded payload"""
+    __slots__ = ()
+
+    @property
+    def legacy(self):
+        return self.version < VERSION
+
+    @property
+    def start(self):
+        """Stream bit offset of the 4-byte length header"""
+        return 0 if self.legacy else PREFIX_VALUES * self.k
+
+    @property
+    def size_start(self):
+        """Stream bit offset of the decompressed size (FLAG_SIZE)"""
+        return self.start + bitplane.HEADER_BITS
+
+    @property
+    def header_bytes(self):
+        """Bytes between the prefix and the payload"""
+        return (bitplane.HEADER_BITS + (SIZE_BITS if self.flags & FLAG_SIZE else 0)) // 8
+
+    @property
+    def body(self):
+        """Stream bit offset of the payload"""
+        return self.start + self.header_bytes * 8
+
+    def usable_values(self, shape):
+        # Framed payloads stay within whole scatter slots of 8 values
+        size = bitplane.carrier_size(shape)
+        return size if self.legacy else size // 8 * 8
+
+    def payload_capacity(self, shape):
+        """Bytes that fit after the length header"""
+        if self.legacy:
+            return bitplane.payload_capacity(shape)
+        stream_bits = (self.usable_values(shape) - PREFIX_VALUES) * self.k
+        return max(stream_bits // 8 - self.header_bytes, 0)
+
+    def values_needed(self, nbytes):
+        """Carrier values a payload of nbytes touches, prefix included"""
+        stream_bits = (self.header_bytes + nbytes) * 8
+        if self.legacy:
+            return stream_bits
+        return PREFIX_VALUES + -(-stream_bits // self.k)
+
+
+LEGACY = Frame(1, 1, CODEC_NONE, 0)
+
+
+def make_frame(k=1, codec=CODEC_NONE, flags=0):
+    """Frame for the requested settings; the legacy frame when nothing needs a prefix"""
+    k = check_k(k)
+    if codec != CODEC_NONE:
+        flags |= FLAG_SIZE
+    if k == 1 and flags == 0:
+        return LEGACY
+    return Frame(VERSION, k, codec, flags)
+
+
+def check_k(k):
+    """Validate a bits-per-value setting"""
+    k = int(k)
+    if not MIN_K <= k <= MAX_K:
+        raise ValueError(f"k must be between {MIN_K} and {MAX_K}")
+    return k
+
+
+def encode_text(text):
+    """(bytes, flags) for a text payload: Latin-1 as in legacy images when every character fits, else UTF-8"""
+    try:
+        return text.encode('latin-1'), 0
+    except UnicodeEncodeError:
+        return text.encode('utf-8'), FLAG_UTF8
+
+
+def decode_text(data, flags):
+    """Text of a payload written by encode_text"""
+    return data.decode('utf-8' if flags & FLAG_UTF8 else 'latin-1')
+
+
+def write_size(x, frame, size, order=None):
+    """Record the decompressed size of a compressed payload (nothing without FLAG_SIZE)"""
+    if frame.flags & FLAG_SIZE:
+        bitplane.embed_bytes(x, frame.size_start, size.to_bytes(4, byteorder='big'), order, frame.k)
+
+
+def read_size(x, frame, order=None):
+    """Recorded decompressed size of the payload, None when the frame has none"""
+    if not frame.flags & FLAG_SIZE:
+        return None
+    return int.from_bytes(bitplane.read_bytes(x, frame.size_start, 4, order, frame.k), byteorder='big')
+
+
+def write_prefix(x, frame, order=None):
+    """Write the frame prefix (nothing for the legacy frame)"""
+    if not frame.legacy:
+        prefix = PREFIX.pack(MAGIC, frame.version, frame.k, frame.codec, frame.flags)
+        bitplane.embed_bytes(x, 0, prefix, order)
+
+
+def read_frame(x, order=None):
+    """Frame of the payload in x, LEGACY when there is no prefix"""
+    if bitplane.carrier_size(x.shape) < PREFIX_VALUES:
+        return LEGACY
+    if bitplane.read_bytes(x, 0, len(MAGIC), order) != MAGIC:
+        return LEGACY
+
+    magic, version, k, codec, flags = PREFIX.unpack(bitplane.read_bytes(x, 0, PREFIX.size, order))
+    if version != VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    if not MIN_K <= k <= MAX_K:
+        raise ValueError(f"Corrupt frame (k={k})")
+    return Frame(version, k, codec, flags)
+
+
+def expected_psnr(k, changed_fraction=1.0, peak=255):
+    """
+    Expected PSNR in dB when a fraction of all samples get k random low bits.
+
+    Replacing k uniformly random low bits with k payload bits gives a mean
+    squared error of (4**k - 1) / 6 per carrier value.
+    """
+    mse = changed_fraction * (4 ** k - 1) / 6
+    if mse <= 0:
+        return math.inf
+    return 10 * math.log10(peak ** 2 / mse)
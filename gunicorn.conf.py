@@ -0,0 +1,38 @@
+"""
+Gunicorn settings for the API server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master, so engines are imported and warmed up
+once before the workers fork (see wsgi.py) and a broken install fails at
+startup. Workers default to one per core, each with a few threads: large
+numpy operations release the GIL and threads cover requests waiting on I/O.
+The batch process pool of each worker gets an equal share of the cores
+instead of one process per core per worker, and starts its processes with
+spawn (batch.START_METHOD) rather than forking a threaded worker.
+
+Every setting can be overridden from the environment.
+"""
+import os
+
+cores = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 0)) or cores
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers after this many requests (0 never recycles)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+# Read by batch.py and admission.py when the app is loaded, which happens after this file
+os.environ.setdefault('BATCH_WORKERS', str(max(cores // workers, 1)))
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
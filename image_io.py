@@ -0,0 +1,126 @@
+import base64
+import logging
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# PNG encoder settings, from fastest to smallest output
+PNG_PROFILES = {
+    'fast': {'compress_level': 1},
+    'balanced': {'compress_level': 6},
+    'smallest': {'optimize': True},
+}
+
+DEFAULT_PNG_PROFILE = os.environ.get('PNG_PROFILE', 'smallest')
+
+# Modes embedded as decoded, keeping their channel count and bit depth
+NATIVE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'I;16'}
+
+# 16-bit grayscale variants that decode to one uint16 sample per pixel
+SIXTEEN_BIT_MODES = {'I;16', 'I;16L', 'I;16B', 'I;16N', 'I'}
+
+logger = logging.getLogger(__name__)
+
+
+def decode_base64_image(base64_string):
+    """Decode a plain or data URL base64 string into encoded image bytes"""
+    # Handle both data URL and plain base64
+    if 'base64,' in base64_string:
+        base64_string = base64_string.split('base64,')[1]
+    
+    return base64.b64decode(base64_string)
+
+
+def native_mode(mode, info=None):
+    """
+    Mode a decoded image is embedded in: native modes stay as they are,
+    16-bit grayscale becomes I;16, palette images become RGB (RGBA when they
+    have transparency) and everything else (CMYK, YCbCr, ...) becomes RGB.
+    """
+    if mode in NATIVE_MODES:
+        return mode
+    if mode in SIXTEEN_BIT_MODES:
+        return 'I;16'
+    if mode == '1':
+        return 'L'
+    if mode == 'PA' or (mode == 'P' and info and 'transparency' in info):
+        return 'RGBA'
+    return 'RGB'
+
+
+def image_to_array(image):
+    """Pixels of an open PIL image as uint8 (or uint16 for 16-bit grayscale) samples"""
+    mode = native_mode(image.mode, image.info)
+    if mode != 'I;16':
+        return np.array(image if image.mode == mode else image.convert(mode))
+    
+    # 32-bit 'I' images decoded from 16-bit files hold values that fit uint16
+    pixels = np.array(image)
+    if pixels.dtype.kind == 'i' and pixels.size and (pixels.min() < 0 or pixels.max() > 0xFFFF):
+        raise ValueError(f"Unsupported {image.mode} image, samples exceed 16 bits")
+    return pixels.astype(np.uint16, copy=False)
+
+
+def bytes_to_image(image_data):
+    """Convert encoded image bytes to numpy image array using Pillow only"""
+    try:
+        with Image.open(BytesIO(image_data)) as image:
+            return image_to_array(image)
+    except Exception as e:
+        logger.warning("Error converting bytes to image: %s", e)
+        raise
+
+
+def base64_to_image(base64_string):
+    """Convert base64 string to numpy image array using Pillow only"""
+    try:
+        return bytes_to_image(decode_base64_image(base64_string))
+    except Exception as e:
+        logger.warning("Error converting base64 to image: %s", e)
+        raise
+
+
+def resolve_png_profile(profile=None, default=None):
+    """Validate a requested PNG profile, falling back to the server default"""
+    profile = (profile or default or DEFAULT_PNG_PROFILE).lower()
+    if profile not in PNG_PROFILES:
+        raise ValueError(f"Unknown PNG profile '{profile}', expected one of: {', '.join(PNG_PROFILES)}")
+    return profile
+
+
+def image_to_png(image_array, profile=None):
+    """Encode numpy image array as PNG bytes using Pillow only"""
+    # Convert numpy array to PIL Image, keeping 16-bit samples and extra channels
+    if image_array.dtype != np.uint16:
+        image_array = image_array.astype(np.uint8, copy=False)
+    image = Image.fromarray(image_array)
+    
+    # Convert to bytes
+    buffered = BytesIO()
+    image.save(buffered, format="PNG", **PNG_PROFILES[resolve_png_profile(profile)])
+    return buffered.getvalue()
+
+
+def encode_png(image_array, profile=None):
+    """Encode to PNG and report (png_bytes, stats) with the size and encode time"""
+    profile = resolve_png_profile(profile)
+    start = time.perf_counter()
+    png_bytes = image_to_png(image_array, profile)
+    encode_time_ms = (time.perf_counter() - start) * 1000
+    return png_bytes, {
+        "png_profile": profile,
+        "encoded_size": len(png_bytes),
+        "encode_time_ms": round(encode_time_ms, 2)
+    }
+
+
+def image_to_base64(image_array, profile=None):
+    """Convert numpy image array to base64 string using Pillow only"""
+    try:
+        return base64.b64encode(image_to_png(image_array, profile)).decode('utf-8')
+    except Exception as e:
+        logger.error("Error converting image to base64: %s", e)
+        raise
@@ -0,0 +1,229 @@
+"""
+Asynchronous hide/extract jobs on the batch worker pool.
+
+Submitting a job returns its id straight away; the work runs on the shared
+process pool and the outcome is written to JOB_DIR on the local filesystem,
+so any server worker on the same host can answer a status poll. Records hold
+extracted plaintext, so JOB_DIR and its files are private to the server's
+user (0700 and 0600) and a directory anyone else can reach is refused. Each server
+process bounds the jobs it has in flight and rejects new ones with QueueFull
+when the bound is reached. Finished jobs expire after JOB_RESULT_TTL seconds.
+"""
+import json
+import os
+import re
+import secrets
+import stat
+import tempfile
+import threading
+import time
+
+import batch
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+# One directory per user by default, so servers of different users never share it
+DEFAULT_JOB_DIR = os.environ.get('JOB_DIR') or os.path.join(
+    tempfile.gettempdir(), f"stego-jobs-{os.getuid()}" if hasattr(os, 'getuid') else 'stego-jobs'
+)
+DEFAULT_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 64))
+DEFAULT_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 600))
+
+# Jobs that never finish (server restarted mid-job) are dropped after this long
+STALE_AFTER = float(os.environ.get('JOB_STALE_AFTER', 3600))
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class QueueFull(Exception):
+    """Raised when no more jobs can be accepted; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _private_dir(path):
+    """Create path for this user only, refusing one owned by another user or open to others"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"Job directory {path} must be a directory owned by this user with mode 0700")
+
+
+def _open_private(path, mode='w'):
+    """Open path for writing, readable by this user only"""
+    return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), mode)
+
+
+def _write_json(path, record):
+    # Write then rename, so readers never see a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with _open_private(tmp) as f:
+        json.dump(record, f)
+    os.replace(tmp, path)
+
+
+def _update(job_dir, job_id, **fields):
+    path = os.path.join(job_dir, f"{job_id}.json")
+    with open(path) as f:
+        record = json.load(f)
+    record.update(fields)
+    _write_json(path, record)
+
+
+def _run_job(job_dir, job_id, kind, item):
+    """Pool entry point: run one job and store its outcome next to its record"""
+    _update(job_dir, job_id, status=RUNNING, started=time.time())
+
+    result = batch.hide_item(item) if kind == 'hide' else batch.extract_item(item)
+    if not result.pop('success'):
+        _update(job_dir, job_id, status=FAILED, finished=time.time(), error=result['error'])
+        return
+
+    stego_image = result.pop('stego_image', None)
+    if stego_image is not None:
+        with _open_private(os.path.join(job_dir, f"{job_id}.png"), 'wb') as f:
+            f.write(stego_image)
+    _update(job_dir, job_id, status=DONE, finished=time.time(), result=result)
+
+
+class JobQueue:
+    """Bounded queue of hide/extract jobs with filesystem-backed results"""
+
+    def __init__(self, job_dir=DEFAULT_JOB_DIR, max_pending=DEFAULT_QUEUE_SIZE, ttl=DEFAULT_RESULT_TTL):
+        self.job_dir = job_dir
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        _private_dir(job_dir)
+
+    def _path(self, job_id, suffix='json'):
+        return os.path.join(self.job_dir, f"{job_id}.{suffix}")
+
+    def submit(self, kind, item):
+        """Queue a 'hide' or 'extract' job for a batch-style item and return its id"""
+        if kind not in ('hide', 'extract'):
+            raise ValueError(f"Unknown job kind '{kind}'")
+        self.sweep()
+
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} jobs pending), retry later")
+            job_id = secrets.token_hex(16)
+            self._pending.add(job_id)
+
+        _write_json(self._path(job_id), {
+            "job_id": job_id,
+            "kind": kind,
+            "technique": item.get('technique') or 'lsb',
+            "status": QUEUED,
+            "created": time.time()
+        })
+
+        try:
+            future = batch.get_pool().submit(_run_job, self.job_dir, job_id, kind, item)
+        except Exception:
+            self._discard(job_id)
+            raise
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        return job_id
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            self._pending.discard(job_id)
+        # A crashed worker never records an outcome itself
+        error = future.exception()
+        if error is not None:
+            try:
+                _update(self.job_dir, job_id, status=FAILED, finished=time.time(), error=f"Worker failed: {error}")
+            except OSError:
+                pass
+
+    def _discard(self, job_id):
+        with self._lock:
+            self._pending.discard(job_id)
+        for suffix in ('json', 'png'):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id):
+        """Job record, or None for unknown and expired jobs"""
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if record['status'] in FINISHED:
+            record['expires'] = record['finished'] + self.ttl
+            if record['expires'] <= time.time():
+                self._discard(job_id)
+                return None
+        return record
+
+    def result_image(self, job_id):
+        """Stego PNG bytes of a finished hide job, or None"""
+        try:
+            with open(self._path(job_id, 'png'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def sweep(self, force=False):
+        """Delete expired and stale jobs; runs at most once per second unless forced"""
+        now = time.time()
+        if not force and now - self._last_sweep < 1:
+            return
+        self._last_sweep = now
+
+        for name in os.listdir(self.job_dir):
+            job_id, _, suffix = name.partition('.')
+            if suffix != 'json' or not _JOB_ID.match(job_id):
+                continue
+            try:
+                with open(os.path.join(self.job_dir, name)) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if record['status'] in FINISHED:
+                expired = record['finished'] + self.ttl <= now
+            else:
+                expired = record['created'] + STALE_AFTER <= now
+            if expired:
+                self._discard(job_id)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "max_pending": self.max_pending,
+            "ttl": self.ttl,
+            "utilization": round(pending / self.max_pending, 4) if self.max_pending else 0.0
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Shared job queue, created on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
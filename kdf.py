@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Key derivation functions recorded in the AES stego header
+KDF_PBKDF2 = 1
+KDF_SCRYPT = 2
+
+SALT_BYTES = 16
+KEY_BYTES = 32  # AES-256
+
+DEFAULT_PBKDF2_ITERATIONS = int(os.environ.get('AES_KDF_ITERATIONS', 200_000))
+
+# Parameters are read back from uploaded images, so they are capped at what
+# this server writes before any key is derived: an image must not be able to
+# pick the server's CPU cost (admission charges AES a fixed KDF cost)
+MAX_PBKDF2_ITERATIONS = int(os.environ.get('AES_KDF_MAX_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS))
+MAX_SCRYPT_LOG2_N = 15
+MAX_SCRYPT_R = 8
+MAX_SCRYPT_P = 1
+SCRYPT_MAXMEM = 256 * 1024 * 1024
+
+
+def pack_params(kdf, params):
+    """Pack KDF parameters into the 32-bit header field"""
+    if kdf == KDF_PBKDF2:
+        (iterations,) = params
+        return iterations
+    if kdf == KDF_SCRYPT:
+        log2_n, r, p = params
+        return (log2_n << 16) | (r << 8) | p
+    raise ValueError(f"Unknown KDF id {kdf}")
+
+
+def unpack_params(kdf, packed):
+    """Inverse of pack_params"""
+    if kdf == KDF_PBKDF2:
+        return (packed,)
+    if kdf == KDF_SCRYPT:
+        return ((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
+    raise ValueError(f"Unknown KDF id {kdf}")
+
+
+def check_params(kdf, params):
+    """Raise ValueError unless params are within the limits this server derives keys for"""
+    if kdf == KDF_PBKDF2:
+        (iterations,) = params
+        if not 1 <= iterations <= MAX_PBKDF2_ITERATIONS:
+            raise ValueError(f"PBKDF2 iterations {iterations} outside 1-{MAX_PBKDF2_ITERATIONS}")
+        return
+    if kdf == KDF_SCRYPT:
+        log2_n, r, p = params
+        if not (1 <= log2_n <= MAX_SCRYPT_LOG2_N and 1 <= r <= MAX_SCRYPT_R and 1 <= p <= MAX_SCRYPT_P):
+            raise ValueError(f"scrypt parameters (log2 N={log2_n}, r={r}, p={p}) outside the allowed limits")
+        return
+    raise ValueError(f"Unknown KDF id {kdf}")
+
+
+def derive(password, salt, kdf=KDF_PBKDF2, params=(DEFAULT_PBKDF2_ITERATIONS,)):
+    """Derive a KEY_BYTES key from a password with a salted, deliberately slow KDF"""
+    secret = password.encode('utf-8')
+    if kdf == KDF_PBKDF2:
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac('sha256', secret, salt, iterations, dklen=KEY_BYTES)
+    if kdf == KDF_SCRYPT:
+        log2_n, r, p = params
+        return hashlib.scrypt(secret, salt=salt, n=1 << log2_n, r=r, p=p,
+                              maxmem=SCRYPT_MAXMEM, dklen=KEY_BYTES)
+    raise ValueError(f"Unknown KDF id {kdf}")
+
+
+class DerivedKeyCache:
+    """
+    Bounded LRU cache of derived keys with TTL eviction and hit/miss counters.
+
+    Entries are keyed on a SHA-256 of the password plus the salt and KDF
+    parameters, so the password itself is never kept as a cache key.
+    """
+
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _cache_key(self, password, salt, kdf, params):
+        fingerprint = hashlib.sha256(password.encode('utf-8')).digest()
+        return (fingerprint, bytes(salt), kdf, tuple(params))
+
+    def derive(self, password, salt, kdf=KDF_PBKDF2, params=(DEFAULT_PBKDF2_ITERATIONS,)):
+        """Cached equivalent of kdf.derive()"""
+        cache_key = self._cache_key(password, salt, kdf, params)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Derive outside the lock, this is the slow part
+        key = derive(password, salt, kdf, params)
+
+        with self._lock:
+            self._entries[cache_key] = (key, now + self.ttl)
+            self._entries.move_to_end(cache_key)
+            self._expire(now)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return key
+
+    def _expire(self, now):
+        expired = [k for k, (_, expires) in self._entries.items() if expires <= now]
+        for k in expired:
+            del self._entries[k]
+        self.evictions += len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+key_cache = DerivedKeyCache(
+    maxsize=int(os.environ.get('KDF_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('KDF_CACHE_TTL', 600))
+)
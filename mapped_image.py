@@ -0,0 +1,137 @@
+import os
+import secrets
+import shutil
+
+import numpy as np
+from PIL import Image
+
+import engines
+from image_io import PNG_PROFILES, image_to_array, resolve_png_profile
+
+# Uncompressed pixel layouts that can be mapped as RGB: bytes per pixel and
+# the channel slice that reorders them to R, G, B
+RAW_MODES = {
+    'RGB': (3, slice(0, 3)),
+    'BGR': (3, slice(2, None, -1)),
+    'RGBX': (4, slice(0, 3)),
+    'BGRX': (4, slice(2, None, -1)),
+}
+
+# Formats that store pixels losslessly, so a hidden payload survives saving
+LOSSLESS_FORMATS = {'PNG', 'BMP', 'TIFF', 'PPM', 'TGA'}
+
+
+def map_pixels(path, writable=False):
+    """
+    Memory-map the pixels of an uncompressed RGB image file (BMP, TGA, PPM,
+    uncompressed TIFF) as a (height, width, 3) uint8 view.
+
+    Returns (memmap, pixels), or None when the file is compressed or uses a
+    layout that cannot be mapped directly.
+    """
+    with Image.open(path) as image:
+        if image.mode != 'RGB' or len(image.tile) != 1:
+            return None
+        codec, extents, offset, args = image.tile[0][:4]
+        width, height = image.size
+
+    if codec != 'raw' or tuple(extents) != (0, 0, width, height):
+        return None
+
+    # PIL describes raw tiles as rawmode or (rawmode, stride, orientation)
+    if not isinstance(args, tuple):
+        args = (args,)
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    orientation = args[2] if len(args) > 2 else 1
+    if rawmode not in RAW_MODES:
+        return None
+
+    pixel_bytes, channels = RAW_MODES[rawmode]
+    stride = stride or width * pixel_bytes
+    mapped = np.memmap(path, dtype=np.uint8, mode='r+' if writable else 'r',
+                       offset=offset, shape=(height, stride))
+
+    # Drop row padding, split pixels, reorder channels and flip bottom-up files,
+    # all as views over the mapping
+    pixels = mapped[:, :width * pixel_bytes].reshape(height, width, pixel_bytes)[:, :, channels]
+    if orientation < 0:
+        pixels = pixels[::-1]
+    return mapped, pixels
+
+
+def _same_format(src, dst):
+    return os.path.splitext(src)[1].lower() == os.path.splitext(dst)[1].lower()
+
+
+def _write_replacing(dst, write):
+    """
+    Call write(path) on a new file next to dst, then move it onto dst, so a
+    failed write never leaves a cover or half-written image at dst.
+    """
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{secrets.token_hex(4)}.tmp")
+    # Created like any output file (umask applies), and never over an existing one
+    os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+    try:
+        write(tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def hide_file(src, dst, source, technique='lsb', encryption_key='', png_profile=None, scatter=False, k=1, codec=None):
+    """
+    Hide a payload (bytes, file-like object or iterable of chunks) in the image
+    at src and write the stego image to dst.
+
+    Uncompressed covers saved to the same format are copied byte for byte and
+    the payload is written into a memory map of the copy, so only the rows
+    carrying it are ever read or written. Anything else is decoded, embedded
+    in place and saved in the format implied by dst. Either way the result
+    only replaces dst once it is complete. Returns True when the
+    memory-mapped path was used.
+    """
+    stego = engines.get_engine(technique)
+
+    if _same_format(src, dst) and map_pixels(src) is not None:
+        def embed(path):
+            shutil.copyfile(src, path)
+            mapped, pixels = map_pixels(path, writable=True)
+            try:
+                stego.hide(pixels, source, encryption_key, inplace=True, scatter=scatter, k=k, codec=codec)
+                mapped.flush()
+            finally:
+                del mapped, pixels
+
+        _write_replacing(dst, embed)
+        return True
+
+    output_format = Image.registered_extensions().get(os.path.splitext(dst)[1].lower())
+    if output_format not in LOSSLESS_FORMATS:
+        raise ValueError(f"Output format of {dst} would not preserve the hidden data")
+
+    with Image.open(src) as image:
+        image_array = image_to_array(image)
+    stego.hide(image_array, source, encryption_key, inplace=True, scatter=scatter, k=k, codec=codec)
+
+    options = PNG_PROFILES[resolve_png_profile(png_profile)] if output_format == 'PNG' else {}
+    _write_replacing(dst, lambda path: Image.fromarray(image_array).save(path, format=output_format, **options))
+    return False
+
+
+def extract_file(path, technique='lsb', encryption_key='', scatter=False):
+    """Extract the hidden payload from an image file, mapping it when possible"""
+    stego = engines.get_engine(technique)
+
+    mapping = map_pixels(path)
+    if mapping is not None:
+        mapped, pixels = mapping
+        return stego.extract(pixels, encryption_key, binary=True, scatter=scatter)
+
+    with Image.open(path) as image:
+        image_array = image_to_array(image)
+    return stego.extract(image_array, encryption_key, binary=True, scatter=scatter)
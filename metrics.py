@@ -0,0 +1,225 @@
+"""
+Per-request stage timers and Prometheus-style metrics.
+
+Each API request gets a RequestTimer that records how long every stage took
+(base64 decode, image decode, embed/extract, PNG encode, ...). When the
+request finishes the stages are folded into latency histograms labelled by
+endpoint, technique and stage, and reported to the client as a Server-Timing
+header. render() produces the Prometheus text exposition format.
+
+Metrics live in process memory, so every server worker reports its own.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, upper bounds (+Inf is implicit)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge:
+    """Value that goes up and down, with labels"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += hits
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    'stego_request_duration_seconds', 'End-to-end API request latency',
+    ('endpoint', 'technique', 'status')))
+STAGE_SECONDS = registry.register(Histogram(
+    'stego_stage_duration_seconds', 'Latency of each processing stage of an API request',
+    ('endpoint', 'technique', 'stage')))
+REQUEST_BYTES = registry.register(Counter(
+    'stego_request_bytes', 'Request body bytes received', ('endpoint',)))
+RESPONSE_BYTES = registry.register(Counter(
+    'stego_response_bytes', 'Response body bytes sent', ('endpoint',)))
+PAYLOAD_BYTES = registry.register(Counter(
+    'stego_payload_bytes', 'Secret payload bytes hidden or extracted', ('technique', 'operation')))
+ADMISSION_DECISIONS = registry.register(Counter(
+    'stego_admission_decisions', 'Admission control outcomes (admitted, queued, rejected)', ('technique', 'decision')))
+ADMISSION_WAIT_SECONDS = registry.register(Histogram(
+    'stego_admission_wait_seconds', 'Time requests waited for admission', ('technique',)))
+ADMISSION_ACTIVE = registry.register(Gauge(
+    'stego_admission_active_requests', 'Requests currently admitted', ('technique',)))
+ADMISSION_MEMORY_BYTES = registry.register(Gauge(
+    'stego_admission_memory_bytes', 'Estimated memory held by admitted requests', ('technique',)))
+ADMISSION_WAITING = registry.register(Gauge(
+    'stego_admission_waiting_requests', 'Requests waiting for admission'))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestTimer:
+    """Stage timings for one request, published when it finishes"""
+
+    def __init__(self, endpoint, technique=''):
+        self.endpoint = endpoint
+        self.technique = technique
+        self.stages = []  # (stage, seconds) in the order they ran
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage name (recorded even if it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def server_timing(self):
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ', '.join(entries)
+
+    def finish(self, status, request_bytes=0, response_bytes=0):
+        """Fold the recorded stages into the global metrics"""
+        for name, seconds in self.stages:
+            STAGE_SECONDS.observe(seconds, endpoint=self.endpoint, technique=self.technique, stage=name)
+        REQUEST_SECONDS.observe(self.elapsed(), endpoint=self.endpoint, technique=self.technique, status=status)
+        REQUEST_BYTES.inc(request_bytes or 0, endpoint=self.endpoint)
+        RESPONSE_BYTES.inc(response_bytes or 0, endpoint=self.endpoint)
+
+
+def count_payload(technique, operation, nbytes):
+    """Count secret payload bytes hidden or extracted by a technique"""
+    PAYLOAD_BYTES.inc(nbytes, technique=technique, operation=operation)
+
+
+def render():
+    return registry.render()
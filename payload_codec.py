@@ -0,0 +1,207 @@
+"""
+Optional compression of payloads before they are encrypted and embedded.
+
+The codec id is stored in the frame prefix (frame.py), so extraction
+decompresses transparently. zlib, bz2 and lzma ship with Python; zstd is used
+when the zstandard package is installed. 'auto' compresses a leading sample
+with every available codec and keeps the best one, or none when compression
+does not pay for itself.
+"""
+import bz2
+import lzma
+import os
+import zlib
+
+import bitplane
+from frame import CODEC_NONE
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CODEC_ZLIB = 1
+CODEC_BZ2 = 2
+CODEC_LZMA = 3
+CODEC_ZSTD = 4
+
+AUTO = 'auto'
+
+# (compressor factory, decompressor factory) by codec id
+_CODECS = {
+    CODEC_ZLIB: (lambda: zlib.compressobj(9), zlib.decompressobj),
+    CODEC_BZ2: (lambda: bz2.BZ2Compressor(9), bz2.BZ2Decompressor),
+    CODEC_LZMA: (lambda: lzma.LZMACompressor(preset=6), lzma.LZMADecompressor),
+}
+if zstandard is not None:
+    _CODECS[CODEC_ZSTD] = (lambda: zstandard.ZstdCompressor(level=10).compressobj(),
+                           lambda: zstandard.ZstdDecompressor().decompressobj())
+
+# Errors the decompressors raise on corrupt input (bz2 raises OSError)
+_ERRORS = (zlib.error, lzma.LZMAError, OSError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+NAMES = {CODEC_NONE: 'none', CODEC_ZLIB: 'zlib', CODEC_BZ2: 'bz2', CODEC_LZMA: 'lzma', CODEC_ZSTD: 'zstd'}
+CODEC_IDS = {name: codec for codec, name in NAMES.items()}
+
+# Fastest first: auto picks the first codec within AUTO_TOLERANCE of the smallest output
+AUTO_ORDER = (CODEC_ZSTD, CODEC_ZLIB, CODEC_BZ2, CODEC_LZMA)
+AUTO_TOLERANCE = 0.02
+
+# Leading bytes compressed by every codec when choosing automatically
+SAMPLE_BYTES = 64 * 1024
+
+# Compression must save at least this share of the sample to be used
+MIN_SAVING = 0.05
+
+# A payload may decompress to MAX_RATIO times the bytes its image can hold,
+# and never to more than MAX_OUTPUT_BYTES (the request size limit by default)
+MAX_RATIO = int(os.environ.get('MAX_DECOMPRESSION_RATIO', 16))
+MAX_OUTPUT_BYTES = int(os.environ.get('MAX_DECOMPRESSED_BYTES', 16 * 1024 * 1024))
+
+# zstd cannot cap its output, so it is fed compressed input in slices this small
+ZSTD_SLICE = 64
+
+
+def available():
+    """Names of the codecs usable here, 'none' included"""
+    return [NAMES[CODEC_NONE]] + [NAMES[codec] for codec in sorted(_CODECS)]
+
+
+def output_limit(capacity):
+    """Most bytes a payload stored in an image holding capacity bytes may decompress to"""
+    return min(capacity * MAX_RATIO, MAX_OUTPUT_BYTES, 0xFFFFFFFF)
+
+
+def resolve(codec):
+    """Codec id for a name, an id, None or '' (no compression); 'auto' is passed through"""
+    if isinstance(codec, str):
+        codec = CODEC_IDS.get(codec.strip().lower(), codec.strip().lower())
+    if codec in (None, '', CODEC_NONE):
+        return CODEC_NONE
+    if codec == AUTO:
+        return AUTO
+    if codec not in _CODECS:
+        raise ValueError(f"Unknown or unavailable compression '{codec}', expected one of: "
+                         f"{', '.join(available() + [AUTO])}")
+    return codec
+
+
+def compress(codec, data):
+    """data compressed in one go (data itself for CODEC_NONE)"""
+    if codec == CODEC_NONE:
+        return bytes(data)
+    compressor = _CODECS[codec][0]()
+    return compressor.compress(data) + compressor.flush()
+
+
+def choose(sample):
+    """Best codec for a leading sample of the payload, CODEC_NONE when compression does not pay"""
+    sample = bytes(sample[:SAMPLE_BYTES])
+    if not sample:
+        return CODEC_NONE
+    sizes = {codec: len(compress(codec, sample)) for codec in AUTO_ORDER if codec in _CODECS}
+    smallest = min(sizes.values())
+    if smallest > len(sample) * (1 - MIN_SAVING):
+        return CODEC_NONE
+    return next(codec for codec in AUTO_ORDER
+                if codec in sizes and sizes[codec] <= smallest * (1 + AUTO_TOLERANCE))
+
+
+def encode_stream(chunks, codec):
+    """
+    (codec id, compressed chunks) for a chunked payload. With 'auto' the codec
+    is chosen from the first chunk, which is then replayed.
+    """
+    codec = resolve(codec)
+    chunks = iter(chunks)
+    if codec == AUTO:
+        first = bytes(next(chunks, b''))
+        codec = choose(first)
+        chunks = _chain(first, chunks)
+    if codec == CODEC_NONE:
+        return codec, chunks
+    return codec, _compress_chunks(codec, chunks)
+
+
+def _chain(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+def _compress_chunks(codec, chunks):
+    compressor = _CODECS[codec][0]()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _inflate(decompressor, chunk, room):
+    """Decompressed bytes of chunk, stopping as soon as more than room bytes come out"""
+    if hasattr(decompressor, 'unconsumed_tail'):  # zlib
+        data = decompressor.decompress(chunk, room + 1)
+        while decompressor.unconsumed_tail and len(data) <= room:
+            data += decompressor.decompress(decompressor.unconsumed_tail, room + 1 - len(data))
+        return data
+    if hasattr(decompressor, 'needs_input'):  # bz2, lzma
+        data = decompressor.decompress(chunk, room + 1)
+        while not decompressor.needs_input and not decompressor.eof and len(data) <= room:
+            data += decompressor.decompress(b'', room + 1 - len(data))
+        return data
+    parts = []
+    for i in range(0, len(chunk), ZSTD_SLICE):
+        parts.append(decompressor.decompress(chunk[i:i + ZSTD_SLICE]))
+        room -= len(parts[-1])
+        if room < 0:
+            break
+    return b''.join(parts)
+
+
+def decode_stream(codec, chunks, limit=MAX_OUTPUT_BYTES, size=None):
+    """
+    Decompressed chunks of a payload stored with codec. Output beyond limit
+    bytes, or other than the recorded size when one is given, is rejected.
+    """
+    if codec == CODEC_NONE:
+        yield from chunks
+        return
+    if codec not in _CODECS:
+        raise ValueError(f"Payload uses unavailable compression '{NAMES.get(codec, codec)}'")
+    if size is not None:
+        if size > limit:
+            raise ValueError(f"Payload would decompress to {size} bytes, more than the {limit} allowed")
+        limit = size
+
+    decompressor = _CODECS[codec][1]()
+    total = 0
+    try:
+        for chunk in chunks:
+            data = _inflate(decompressor, chunk, limit - total)
+            total += len(data)
+            if total > limit:
+                raise ValueError(f"Decompressed payload exceeds {limit} bytes")
+            if data:
+                yield data
+        if hasattr(decompressor, 'flush'):
+            data = decompressor.flush()
+            total += len(data)
+            if data:
+                yield data
+    except _ERRORS as e:
+        raise ValueError(f"Corrupt {NAMES[codec]} payload: {e}") from e
+    if not getattr(decompressor, 'eof', True):
+        raise ValueError("Compressed payload is truncated")
+    if size is not None and total != size:
+        raise ValueError(f"Decompressed payload is {total} bytes, not the {size} recorded")
+
+
+def compressed_size(codec, source):
+    """(codec id, bytes embedded) for a payload in memory, resolving 'auto'"""
+    codec = resolve(codec)
+    if codec == AUTO:
+        codec = choose(source)
+    if codec == CODEC_NONE:
+        return codec, len(source)
+    return codec, sum(len(chunk) for chunk in _compress_chunks(codec, bitplane.iter_chunks(source)))
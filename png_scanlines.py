@@ -0,0 +1,173 @@
+"""
+Incremental PNG decoding of the top rows of an image.
+
+Hidden payloads start at the first carrier value, so header checks only need
+the first few scanlines. PNGScanlines inflates IDAT data just far enough to
+reconstruct the rows asked for, leaving the rest of the image compressed.
+Rows come back with the same dtype and channel layout as
+image_io.bytes_to_image would give for the whole image.
+"""
+import struct
+import zlib
+
+import numpy as np
+
+SIGNATURE = b'\x89PNG\r\n\x1a\n'
+CHUNK = struct.Struct('>I4s')
+IHDR = struct.Struct('>IIBBBBB')
+
+# PNG colour type: (channels, mode of 8-bit images)
+COLOR_TYPES = {
+    0: (1, 'L'),
+    2: (3, 'RGB'),
+    4: (2, 'LA'),
+    6: (4, 'RGBA'),
+}
+
+# Compressed bytes fed to the inflater per step
+READ_SIZE = 64 * 1024
+
+
+class UnsupportedPNG(ValueError):
+    """Raised for data that is not a PNG, or a PNG layout this reader does not handle"""
+
+
+def iter_chunks(data, offset=8):
+    """(type, data offset, data length) of every chunk after the signature, up to IEND"""
+    while offset + CHUNK.size <= len(data):
+        length, kind = CHUNK.unpack_from(data, offset)
+        start = offset + CHUNK.size
+        yield kind, start, length
+        if kind == b'IEND':
+            return
+        offset = start + length + 4  # skip the CRC
+
+
+def _unfilter_row(filter_type, line, prev, bpp):
+    """Reconstruct one scanline from its filtered bytes and the previous row"""
+    if filter_type == 0:
+        return line.copy()
+    if filter_type == 1:
+        # Sub: a running sum along each byte lane of the pixel
+        return np.cumsum(line.reshape(-1, bpp), axis=0, dtype=np.uint8).reshape(-1)
+    if filter_type == 2:
+        return line + prev
+
+    # Average and Paeth depend on the byte just reconstructed, so run them byte by byte
+    out = bytearray(line.tobytes())
+    up = prev.tobytes()
+    if filter_type == 3:
+        for i in range(len(out)):
+            left = out[i - bpp] if i >= bpp else 0
+            out[i] = (out[i] + ((left + up[i]) >> 1)) & 0xFF
+    elif filter_type == 4:
+        for i in range(len(out)):
+            if i >= bpp:
+                a, b, c = out[i - bpp], up[i], up[i - bpp]
+            else:
+                a, b, c = 0, up[i], 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                predictor = a
+            elif pb <= pc:
+                predictor = b
+            else:
+                predictor = c
+            out[i] = (out[i] + predictor) & 0xFF
+    else:
+        raise UnsupportedPNG(f"Corrupt PNG (filter type {filter_type})")
+    return np.frombuffer(bytes(out), dtype=np.uint8)
+
+
+class PNGScanlines:
+    """
+    Header and top rows of a PNG held in memory.
+
+    Supports non-interlaced greyscale, RGB and their alpha variants at 8 or
+    16 bits per sample; palette, low bit depth and interlaced images raise
+    UnsupportedPNG so callers can fall back to a full decode.
+    """
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        if bytes(self.data[:8]) != SIGNATURE:
+            raise UnsupportedPNG("Not a PNG image")
+
+        length, kind = CHUNK.unpack_from(self.data, 8)
+        if kind != b'IHDR' or length != IHDR.size:
+            raise UnsupportedPNG("Corrupt PNG (missing IHDR)")
+        (self.width, self.height, self.bit_depth, self.color_type,
+         _, _, self.interlace) = IHDR.unpack_from(self.data, 16)
+
+        if self.color_type not in COLOR_TYPES or self.bit_depth not in (8, 16):
+            raise UnsupportedPNG(f"Unsupported PNG layout (colour type {self.color_type}, {self.bit_depth}-bit)")
+        if self.interlace:
+            raise UnsupportedPNG("Interlaced PNGs are decoded in full")
+
+        self.channels, mode = COLOR_TYPES[self.color_type]
+        self.mode = 'I;16' if self.bit_depth == 16 and self.channels == 1 else mode
+        self.bpp = self.channels * self.bit_depth // 8
+        self.stride = self.width * self.bpp
+
+    @property
+    def shape(self):
+        """Shape of the fully decoded image"""
+        if self.channels == 1:
+            return (self.height, self.width)
+        return (self.height, self.width, self.channels)
+
+    def _idat(self):
+        """Compressed image data, in pieces of at most READ_SIZE bytes"""
+        for kind, start, length in iter_chunks(self.data):
+            if kind == b'IDAT':
+                for piece in range(start, start + length, READ_SIZE):
+                    yield self.data[piece:min(piece + READ_SIZE, start + length)]
+
+    def raw_rows(self, count):
+        """Filtered bytes of the first count scanlines (filter byte included), inflating no further"""
+        needed = count * (self.stride + 1)
+        inflater = zlib.decompressobj()
+        raw = bytearray()
+        for piece in self._idat():
+            raw += inflater.decompress(piece, needed - len(raw))
+            while inflater.unconsumed_tail and len(raw) < needed:
+                raw += inflater.decompress(inflater.unconsumed_tail, needed - len(raw))
+            if len(raw) >= needed:
+                return raw
+        raise UnsupportedPNG("Truncated PNG image data")
+
+    def rows(self, count):
+        """The first count rows as an array, uint16 for 16-bit greyscale and uint8 otherwise"""
+        count = min(count, self.height)
+        return self.to_pixels(self.unfilter(self.raw_rows(count), count))
+
+    def unfilter(self, raw, count):
+        """(count, stride) scanline bytes reconstructed from the first count filtered rows in raw"""
+        raw = np.frombuffer(raw, dtype=np.uint8, count=count * (self.stride + 1)).reshape(count, self.stride + 1)
+        lines = np.empty((count, self.stride), dtype=np.uint8)
+        prev = np.zeros(self.stride, dtype=np.uint8)
+        for r in range(count):
+            prev = lines[r] = _unfilter_row(raw[r, 0], raw[r, 1:], prev, self.bpp)
+        return lines
+
+    def to_pixels(self, lines):
+        """Pixel rows of scanline bytes, laid out as image_io.bytes_to_image would decode them"""
+        count = lines.shape[0]
+        pixels = lines
+        if self.bit_depth == 16:
+            if self.mode == 'I;16':
+                return pixels.view('>u2').astype(np.uint16)
+            # Pillow keeps the high byte of 16-bit colour samples
+            pixels = pixels[:, ::2]
+        if self.channels == 1:
+            return pixels
+        return pixels.reshape(count, self.width, self.channels)
+
+    def from_pixels(self, pixels):
+        """(count, stride) scanline bytes of pixel rows; 16-bit colour cannot be rebuilt from its high bytes"""
+        if self.bit_depth == 16:
+            if self.mode != 'I;16':
+                raise UnsupportedPNG("16-bit colour rows cannot be re-encoded")
+            return pixels.astype('>u2').view(np.uint8).reshape(pixels.shape[0], self.stride)
+        return np.ascontiguousarray(pixels, dtype=np.uint8).reshape(pixels.shape[0], self.stride)
@@ -0,0 +1,225 @@
+"""
+Replacing the hidden message of a PNG stego image without re-encoding it.
+
+A payload only occupies the top rows of the image (scatter mode aside), so
+update() touches nothing below them:
+
+- The first update splits the image data in two. The top `window` rows are
+  deflated up to a zlib full flush, and the rest as their own run of IDAT
+  chunks. The first row of the rest is re-filtered with Sub, so it does not
+  depend on the rows above it. A private stUP chunk records the window and
+  the checksum and length of the rest. This pass inflates the whole image
+  once and deflates everything below the window once.
+- Every later update whose payload fits in the window inflates only the
+  window rows, embeds the new payload, deflates them again and patches the
+  zlib checksum (adler32_combine). The IDAT chunks below the window are
+  copied byte for byte, so the cost follows the message, not the image.
+
+Images this cannot handle (not a PNG, interlaced, palette, below 8-bit or
+16-bit colour) and scatter mode, which spreads the payload over the whole
+image, fall back to a full decode, embed and encode.
+"""
+import struct
+import time
+import zlib
+
+import numpy as np
+
+import capacity
+import engines
+import frame as framing
+from image_io import PNG_PROFILES, bytes_to_image, encode_png, resolve_png_profile
+from png_scanlines import CHUNK, SIGNATURE, PNGScanlines, UnsupportedPNG, iter_chunks
+
+# Private, unsafe-to-copy chunk: editors that change the image data must drop it
+LAYOUT_CHUNK = b'stUP'
+# window rows, adler32 of the window rows, adler32 and length of the rows below
+LAYOUT = struct.Struct('>IIIQ')
+
+# A new window holds WINDOW_HEADROOM times the rows of the payload, and at least
+# MIN_WINDOW_BYTES of payload, so later (longer) messages reuse it
+WINDOW_HEADROOM = 2
+MIN_WINDOW_BYTES = 4096
+
+# Compressed bytes per IDAT chunk written below the window
+IDAT_SIZE = 256 * 1024
+
+ADLER_BASE = 65521
+FILTER_SUB = 1
+
+
+def adler32_combine(adler1, adler2, len2):
+    """Adler-32 of A + B from the checksums of A and B and the length of B (as zlib does)"""
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = rem * sum1 % ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - rem
+    return (sum2 % ADLER_BASE) << 16 | (sum1 % ADLER_BASE)
+
+
+def _chunk(kind, data):
+    return CHUNK.pack(len(data), kind) + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _sub_filter(lines, bpp):
+    """Sub-filtered scanlines, filter byte included, for (count, stride) scanline bytes"""
+    out = np.empty((lines.shape[0], lines.shape[1] + 1), dtype=np.uint8)
+    out[:, 0] = FILTER_SUB
+    out[:, 1:bpp + 1] = lines[:, :bpp]
+    np.subtract(lines[:, bpp:], lines[:, :-bpp], out=out[:, bpp + 1:])
+    return out.tobytes()
+
+
+def _compress_level(profile):
+    # The smallest profile is Pillow's optimize pass, which is level 9
+    return PNG_PROFILES[profile].get('compress_level', 9)
+
+
+def _rows_needed(stego, shape, size, k, codec, flags):
+    """Fewest top rows of an image of shape that hold size payload bytes, or None"""
+    if stego.capacity(shape, k, codec, flags) < size:
+        return None
+    lo, hi = 1, shape[0]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if stego.capacity((mid,) + shape[1:], k, codec, flags) >= size:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _idats(png):
+    """(data offset, length) of every IDAT chunk"""
+    return [(offset, length) for kind, offset, length in iter_chunks(png.data) if kind == b'IDAT']
+
+
+def _read_layout(png, idats):
+    """(window, prefix adler32, tail adler32, tail length) of an image split by update(), or None"""
+    layout = next((LAYOUT.unpack_from(png.data, start) for kind, start, length in iter_chunks(png.data)
+                   if kind == LAYOUT_CHUNK and length == LAYOUT.size), None)
+    if layout is None or len(idats) < 2 or idats[-1][1] != 4 or not 0 < layout[0] <= png.height:
+        return None
+    window, prefix_adler, tail_adler, tail_len = layout
+    last_start = idats[-1][0]
+    if png.data[last_start:last_start + 4] != struct.pack('>I', adler32_combine(prefix_adler, tail_adler, tail_len)):
+        return None
+    return layout
+
+
+def _inflate_window(png, idat, window, prefix_adler):
+    """Filtered window rows from the first IDAT chunk, or None when it no longer matches the layout"""
+    start, length = idat
+    try:
+        raw = zlib.decompressobj().decompress(png.data[start:start + length])
+    except zlib.error:
+        return None
+    if len(raw) != window * (png.stride + 1) or zlib.adler32(raw) != prefix_adler:
+        return None
+    return raw
+
+
+def _split(png, window, level):
+    """(window scanlines, IDAT chunks below the window, their adler32 and length), inflating everything"""
+    raw = png.raw_rows(png.height)
+    row = png.stride + 1
+    lines = png.unfilter(raw, min(window + 1, png.height))
+    tail = b''
+    if window < png.height:
+        # Re-filter the first row below the window so it no longer depends on the window
+        tail = _sub_filter(lines[window:], png.bpp) + bytes(raw[(window + 1) * row:])
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(tail) + compressor.flush()
+    chunks = b''.join(_chunk(b'IDAT', deflated[i:i + IDAT_SIZE]) for i in range(0, len(deflated), IDAT_SIZE))
+    return lines[:window], chunks, zlib.adler32(tail), len(tail)
+
+
+def window_rows(image_data):
+    """Rows an update rewrites in an image split by an earlier update, None for any other image"""
+    try:
+        png = PNGScanlines(image_data)
+    except UnsupportedPNG:
+        return None
+    layout = _read_layout(png, _idats(png))
+    return layout[0] if layout is not None else None
+
+
+def update(image_data, payload, technique='lsb', encryption_key='', k=1, codec=None, png_profile=None,
+           scatter=False):
+    """
+    Hide payload (text or bytes) in an encoded stego image, replacing its message.
+
+    Returns (png_bytes, stats) like image_io.encode_png, with "update_mode"
+    ('window', 'split' or 'full') and "rows_rewritten" added.
+    """
+    profile = resolve_png_profile(png_profile)
+    stego = engines.get_engine(technique)
+    codec, size, flags = capacity.compressed_payload(technique, payload, codec)
+    if not scatter:
+        try:
+            png = PNGScanlines(image_data)
+            if png.bit_depth == 8 or png.mode == 'I;16':
+                return _update_rows(png, stego, payload, encryption_key, k, codec, size, flags, profile)
+        except UnsupportedPNG:
+            pass
+
+    start = time.perf_counter()
+    image_array = bytes_to_image(image_data)
+    stego.hide(image_array, payload, encryption_key, inplace=True, scatter=scatter, k=k, codec=codec)
+    png_bytes, stats = encode_png(image_array, profile)
+    stats.update(encode_time_ms=round((time.perf_counter() - start) * 1000, 2),
+                 update_mode='full', rows_rewritten=int(image_array.shape[0]))
+    return png_bytes, stats
+
+
+def _update_rows(png, stego, payload, encryption_key, k, codec, size, flags, profile):
+    """update() for a PNG whose scanlines can be rebuilt from the decoded pixels"""
+    start = time.perf_counter()
+    framing.check_k(k)
+    needed = _rows_needed(stego, png.shape, size, k, codec, flags)
+    if needed is None:
+        raise ValueError(f"Image too small for the secret text. Need {size} bytes, "
+                         f"capacity of a {png.width}x{png.height} image is "
+                         f"{stego.capacity(png.shape, k, codec, flags)} bytes")
+    level = _compress_level(profile)
+
+    idats = _idats(png)
+    layout = _read_layout(png, idats)
+    lines = None
+    if layout is not None and needed <= layout[0]:
+        window, prefix_adler, tail_adler, tail_len = layout
+        raw = _inflate_window(png, idats[0], window, prefix_adler)
+        if raw is not None:
+            mode = 'window'
+            lines = png.unfilter(raw, window)
+            tail = b''.join(bytes(png.data[offset - CHUNK.size:offset + length + 4]) for offset, length in idats[1:-1])
+    if lines is None:
+        mode = 'split'
+        per_row = max(stego.capacity((1,) + png.shape[1:], k, codec, flags), 1)
+        window = min(png.height, max(needed * WINDOW_HEADROOM, needed + -(-MIN_WINDOW_BYTES // per_row)))
+        lines, tail, tail_adler, tail_len = _split(png, window, level)
+
+    pixels = stego.hide(png.to_pixels(lines), payload, encryption_key, inplace=True, k=k, codec=codec)
+    prefix = _sub_filter(png.from_pixels(pixels), png.bpp)
+    compressor = zlib.compressobj(level)
+    deflated = compressor.compress(prefix) + compressor.flush(zlib.Z_FULL_FLUSH)
+    adler = adler32_combine(zlib.adler32(prefix), tail_adler, tail_len)
+
+    out = [SIGNATURE]
+    for kind, offset, length in iter_chunks(png.data):
+        if kind == b'IDAT' and offset == idats[0][0]:
+            out += [_chunk(LAYOUT_CHUNK, LAYOUT.pack(window, zlib.adler32(prefix), tail_adler, tail_len)),
+                    _chunk(b'IDAT', deflated), tail, _chunk(b'IDAT', struct.pack('>I', adler))]
+        elif kind not in (b'IDAT', LAYOUT_CHUNK):
+            out.append(bytes(png.data[offset - CHUNK.size:offset + length + 4]))
+    png_bytes = b''.join(out)
+
+    return png_bytes, {
+        "png_profile": profile,
+        "encoded_size": len(png_bytes),
+        "encode_time_ms": round((time.perf_counter() - start) * 1000, 2),
+        "update_mode": mode,
+        "rows_rewritten": int(window if mode == 'window' else png.height)
+    }
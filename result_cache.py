@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Per-process secret for key fingerprints, so cache keys never contain (or
+# allow offline guessing of) the encryption key
+_FINGERPRINT_SECRET = os.urandom(32)
+
+
+def key_fingerprint(encryption_key):
+    """Keyed BLAKE2b of an encryption key, stable for the life of the process"""
+    return hashlib.blake2b(encryption_key.encode('utf-8'), key=_FINGERPRINT_SECRET, digest_size=16).digest()
+
+
+def _value_size(value):
+    return len(value) if isinstance(value, (bytes, bytearray)) else len(value.encode('utf-8'))
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of extraction results, addressed by the uploaded image.
+
+    Entries are keyed on a BLAKE2b hash of the raw image bytes, the technique,
+    the output mode and a fingerprint of the encryption key, so a result is
+    only returned for the same image and the same key. Eviction keeps both the
+    entry count and the total size of cached results under their limits.
+    """
+
+    def __init__(self, maxsize=256, maxbytes=64 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.currbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.maxbytes > 0
+
+    def make_key(self, image_data, technique, encryption_key='', binary=False, scatter=False):
+        """Cache key for extracting from image_data; the key is only fingerprinted"""
+        image_hash = hashlib.blake2b(image_data, digest_size=32).digest()
+        return (image_hash, technique, key_fingerprint(encryption_key), bool(binary), bool(scatter))
+
+    def get(self, cache_key):
+        """Cached result, or None on a miss"""
+        with self._lock:
+            value = self._entries.get(cache_key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return value
+
+    def put(self, cache_key, value):
+        """Store a result, evicting least recently used entries to stay in bounds"""
+        size = _value_size(value)
+        if not self.enabled or size > self.maxbytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(cache_key, None)
+            if old is not None:
+                self.currbytes -= _value_size(old)
+            self._entries[cache_key] = value
+            self.currbytes += size
+            while len(self._entries) > self.maxsize or self.currbytes > self.maxbytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.currbytes -= _value_size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.currbytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": self.currbytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# EXTRACT_CACHE_SIZE=0 turns the cache off
+extract_cache = ResultCache(
+    maxsize=int(os.environ.get('EXTRACT_CACHE_SIZE', 256)),
+    maxbytes=int(os.environ.get('EXTRACT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+)
@@ -5,19 +5,24 @@ import sys
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(__file__))
 
-# Set environment variable for Flask
-os.environ['FLASK_ENV'] = 'development'
+# Engines are warmed up on import; a broken install fails here, not on the first request
+from wsgi import app, logger
 
-from app import app
+# Development server only: production runs gunicorn -c gunicorn.conf.py wsgi:app
+DEBUG = os.environ.get('FLASK_DEBUG', '0') == '1'
+PORT = int(os.environ.get('PORT', 5000))
 
 if __name__ == '__main__':
-    print("🚀 Starting Steganography API Server...")
-    print("📍 Server will run at: http://localhost:5000")
-    print("📚 API Documentation:")
-    print("   GET  /api/health - Health check")
-    print("   POST /api/hide - Hide data in image")
-    print("   POST /api/extract - Extract data from image")
-    print("   POST /api/capacity - Check image capacity")
-    print("\n⚡ Starting server...")
+    logger.info("Starting Steganography API Server...")
+    logger.info("Server will run at: http://localhost:%d", PORT)
+    logger.info("API Documentation:")
+    logger.info("   GET  /api/health - Health check")
+    logger.info("   GET  /api/metrics - Prometheus metrics")
+    logger.info("   POST /api/hide - Hide data in image")
+    logger.info("   POST /api/update - Replace the message of a stego image")
+    logger.info("   POST /api/extract - Extract data from image")
+    logger.info("   POST /api/capacity - Check image capacity")
+    logger.info("   POST /api/detect - Detect a hidden payload from the header")
     
-    app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=True)
\ No newline at end of file
+    # No reloader: it imports the app twice and restarts on every file change
+    app.run(debug=DEBUG, host='0.0.0.0', port=PORT, use_reloader=False, threaded=True)
@@ -0,0 +1,304 @@
+"""
+Command-line tool for hiding and extracting payloads in local image files.
+
+    python -m steganography hide COVERS... -o OUT (--text TEXT | --file PAYLOAD) [options]
+    python -m steganography extract IMAGES... -o OUT [options]
+    python -m steganography capacity IMAGES... [options]
+    python -m steganography bench [benchmark options]
+
+Inputs are files or directories, searched recursively for images. Images are
+read from and written to disk directly (uncompressed covers are memory
+mapped), one file per task on a process pool. Every finished file is
+appended to a JSON-lines manifest as soon as it completes, and --resume skips
+files the manifest already records as done, so an interrupted run picks up
+where it stopped.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+import capacity
+import engines
+import frame as framing
+import mapped_image
+import payload_codec
+from image_io import PNG_PROFILES
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Extensions Pillow can open, searched for when an input is a directory
+IMAGE_EXTENSIONS = set(Image.registered_extensions())
+
+
+def find_images(inputs, exclude=None):
+    """(path, path relative to its input) for every image file under inputs, in sorted order"""
+    exclude = os.path.abspath(exclude) if exclude else None
+    for root in inputs:
+        if os.path.isfile(root):
+            yield root, os.path.basename(root)
+            continue
+        if not os.path.isdir(root):
+            raise FileNotFoundError(f"No such file or directory: {root}")
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Never descend into the output directory of this run
+            dirnames[:] = sorted(d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != exclude)
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    path = os.path.join(dirpath, name)
+                    yield path, os.path.relpath(path, root)
+
+
+def stego_path(output_dir, relpath):
+    """Where the stego copy of relpath goes: same format when lossless, PNG otherwise"""
+    base, ext = os.path.splitext(relpath)
+    if Image.registered_extensions().get(ext.lower()) not in mapped_image.LOSSLESS_FORMATS:
+        ext = '.png'
+    return os.path.join(output_dir, base + ext)
+
+
+def hide_task(task):
+    """Pool entry point: hide the payload in one cover; errors are recorded, never raised"""
+    record = {"command": "hide", "input": task['input'], "output": task['output']}
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(task['output']) or '.', exist_ok=True)
+        mapped = mapped_image.hide_file(
+            task['input'], task['output'], task['payload'],
+            technique=task['technique'], encryption_key=task['key'],
+            png_profile=task['png_profile'], scatter=task['scatter'], k=task['k'], codec=task['codec']
+        )
+        record.update(status='ok', technique=task['technique'], k=task['k'], mapped=mapped,
+                      compression=payload_codec.NAMES[task['codec']], output_bytes=os.path.getsize(task['output']))
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def extract_task(task):
+    """Pool entry point: extract the payload of one image to a .bin file"""
+    record = {"command": "extract", "input": task['input'], "output": task['output']}
+    start = time.perf_counter()
+    try:
+        data = mapped_image.extract_file(task['input'], task['technique'], task['key'], scatter=task['scatter'])
+        os.makedirs(os.path.dirname(task['output']) or '.', exist_ok=True)
+        with open(task['output'], 'wb') as f:
+            f.write(data)
+        record.update(status='ok', technique=task['technique'], payload_bytes=len(data),
+                      sha256=hashlib.sha256(data).hexdigest())
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def capacity_task(task):
+    """Pool entry point: capacity of one image from its header"""
+    record = {"command": "capacity", "input": task['input']}
+    start = time.perf_counter()
+    try:
+        width, height, channels, bits = capacity.read_image_header(task['input'])
+        plans = {
+            name: capacity.plan_capacity(width, height, name, channels, task['k'], bits)
+            for name in task['techniques']
+        }
+        record.update(status='ok', image_size=f"{width}x{height}", channels=channels, k=task['k'],
+                      capacity={name: plan.max_payload_bytes for name, plan in plans.items()},
+                      expected_psnr_db=next(iter(plans.values())).expected_psnr_db)
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    record['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def load_done(manifest_path, command):
+    """Inputs the manifest records as successfully processed by command"""
+    done = set()
+    try:
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by the interruption
+                if record.get('command') == command and record.get('status') == 'ok':
+                    done.add(record['input'])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def open_manifest(manifest_path, resume):
+    """Manifest to append to when resuming, or a fresh one"""
+    if manifest_path == '-':
+        return sys.stdout
+    manifest = open(manifest_path, 'a+' if resume else 'w')
+    # Terminate a line cut short by the interruption before appending
+    if manifest.tell():
+        manifest.seek(manifest.tell() - 1)
+        if manifest.read(1) != '\n':
+            manifest.write('\n')
+    return manifest
+
+
+def run_tasks(func, tasks, workers, manifest, progress=True):
+    """
+    Run func over tasks on a pool of workers, appending each record to the
+    manifest as it finishes. Returns (succeeded, failed).
+    """
+    counts = {'ok': 0, 'error': 0}
+
+    def finish(record):
+        counts[record['status']] += 1
+        manifest.write(json.dumps(record) + '\n')
+        manifest.flush()
+        if progress:
+            done = counts['ok'] + counts['error']
+            detail = record.get('error') or f"{record['elapsed_ms']} ms"
+            print(f"[{done}/{len(tasks)}] {record['status']} {record['input']} ({detail})", file=sys.stderr)
+
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            finish(func(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(func, task): task for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    finish(future.result())
+                except Exception as e:
+                    finish({"command": func.__name__.replace('_task', ''), "input": futures[future]['input'],
+                            "status": 'error', "error": f"Worker failed: {e}", "elapsed_ms": 0})
+    return counts['ok'], counts['error']
+
+
+def build_tasks(args, payload):
+    """Tasks for the hide, extract or capacity command"""
+    output_dir = getattr(args, 'output_dir', None)
+    if args.command == 'hide':
+        # Every cover gets the same payload, so 'auto' is decided once up front
+        codec = payload_codec.resolve(args.compress)
+        if codec == payload_codec.AUTO:
+            data = engines.get_engine(args.technique).encode_text(payload) if isinstance(payload, str) else payload
+            codec = payload_codec.choose(data)
+    tasks = []
+    for path, relpath in find_images(args.inputs, exclude=output_dir):
+        task = {"input": path}
+        if args.command == 'hide':
+            task.update(output=stego_path(output_dir, relpath), payload=payload, technique=args.technique,
+                        key=args.key, png_profile=args.png_profile, scatter=args.scatter, k=args.k, codec=codec)
+        elif args.command == 'extract':
+            task.update(output=os.path.join(output_dir, relpath + '.bin'), technique=args.technique,
+                        key=args.key, scatter=args.scatter)
+        else:
+            task.update(techniques=[args.technique] if args.technique else engines.techniques(), k=args.k)
+        tasks.append(task)
+    return tasks
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='python -m steganography',
+                                     description="Hide and extract payloads in local image files")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def common(sub, output=True):
+        sub.add_argument('inputs', nargs='+', help="image files or directories")
+        if output:
+            sub.add_argument('-o', '--output-dir', required=True, help="directory for the results")
+        sub.add_argument('--manifest', help=f"JSON-lines manifest (default: OUTPUT_DIR/{MANIFEST_NAME}, or stdout)")
+        sub.add_argument('--resume', action='store_true', help="skip inputs the manifest records as done")
+        sub.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+        sub.add_argument('-q', '--quiet', action='store_true', help="no per-file progress on stderr")
+
+    hide = commands.add_parser('hide', help="hide a payload in every cover")
+    common(hide)
+    payload = hide.add_mutually_exclusive_group(required=True)
+    payload.add_argument('--text', help="secret text to hide")
+    payload.add_argument('--file', help="file whose bytes are hidden")
+    hide.add_argument('-t', '--technique', default='lsb', choices=engines.techniques())
+    hide.add_argument('--key', default='', help="encryption key")
+    hide.add_argument('-k', type=int, default=1, help="payload bits per carrier value (1-4)")
+    hide.add_argument('--scatter', action='store_true', help="spread the payload over keyed positions")
+    hide.add_argument('--png-profile', default=None, choices=list(PNG_PROFILES))
+    hide.add_argument('--compress', default='none', choices=payload_codec.available() + [payload_codec.AUTO],
+                      help="compress the payload before embedding ('auto' picks the best codec)")
+
+    extract = commands.add_parser('extract', help="extract the payload of every image to OUTPUT_DIR")
+    common(extract)
+    extract.add_argument('-t', '--technique', default='lsb', choices=engines.techniques())
+    extract.add_argument('--key', default='', help="encryption key")
+    extract.add_argument('--scatter', action='store_true', help="payload was hidden in scatter mode")
+
+    cap = commands.add_parser('capacity', help="report the capacity of every image")
+    common(cap, output=False)
+    cap.add_argument('-t', '--technique', default=None, choices=engines.techniques())
+    cap.add_argument('-k', type=int, default=1, help="payload bits per carrier value (1-4)")
+
+    commands.add_parser('bench', help="offline benchmark (see python benchmark.py --help)", add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['bench']:
+        import benchmark
+        benchmark.main(argv[1:])
+        return 0
+
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'k', 1) != 1:
+        try:
+            framing.check_k(args.k)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.command in ('hide', 'extract') and engines.get_engine(args.technique).requires_key and not args.key:
+        parser.error(f"--key is required for {args.technique}")
+    if getattr(args, 'scatter', False) and not args.key:
+        parser.error("--scatter needs a --key")
+
+    payload = None
+    if args.command == 'hide':
+        if args.file:
+            with open(args.file, 'rb') as f:
+                payload = f.read()
+        else:
+            payload = args.text
+
+    output_dir = getattr(args, 'output_dir', None)
+    manifest_path = args.manifest or (os.path.join(output_dir, MANIFEST_NAME) if output_dir else '-')
+    tasks = build_tasks(args, payload)
+
+    skipped = 0
+    if args.resume and manifest_path != '-':
+        done = load_done(manifest_path, args.command)
+        skipped = sum(task['input'] in done for task in tasks)
+        tasks = [task for task in tasks if task['input'] not in done]
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    manifest = open_manifest(manifest_path, args.resume)
+    start = time.perf_counter()
+    try:
+        succeeded, failed = run_tasks(
+            {'hide': hide_task, 'extract': extract_task, 'capacity': capacity_task}[args.command],
+            tasks, args.workers, manifest, progress=not args.quiet
+        )
+    finally:
+        if manifest is not sys.stdout:
+            manifest.close()
+
+    if not args.quiet:
+        print(f"{args.command}: {succeeded} ok, {failed} failed, {skipped} skipped "
+              f"in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
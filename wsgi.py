@@ -1,4 +1,32 @@
-from app import app
+"""
+WSGI entry point for deployment:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module self-tests every engine and touches the PNG codec, so
+the first request is served warm. Under gunicorn with preload_app this runs
+once in the master before the workers fork, and a failing engine stops the
+server from starting. Set WARMUP=0 to skip it.
+"""
+import os
+
+import numpy as np
+
+import engines
+from app import app, logger
+from image_io import bytes_to_image, encode_png
+
+
+def warmup():
+    """Self-test the engines and round-trip a small PNG; raises RuntimeError on failure"""
+    names = engines.warmup()
+    png_bytes, _ = encode_png(np.zeros(engines.WARMUP_SHAPE, dtype=np.uint8))
+    bytes_to_image(png_bytes)
+    logger.info("Warmup done: %s", ', '.join(names))
+
+
+if os.environ.get('WARMUP', '1') != '0':
+    warmup()
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()
@@ -1,102 +1,47 @@
 import numpy as np
 
-class XORSteganography:
-    def __init__(self):
-        self.d = {chr(i): i for i in range(256)}
-        self.c = {i: chr(i) for i in range(256)}
+import bitplane
+import engines
+import frame as framing
+
+def _key_bytes(encryption_key):
+    """Key as a byte array: Latin-1 as in legacy images when every character fits, else UTF-8"""
+    if not encryption_key:
+        raise ValueError("Encryption key required for this technique")
+    key, _ = framing.encode_text(encryption_key)
+    return np.frombuffer(key, dtype=np.uint8)
+
+
+class XORSteganography(engines.Steganography):
+    """The payload XORed with the repeating key, which continues from the length into the body"""
+    name = 'xor'
+    requires_key = True
     
-    def hide_data(self, image_array, secret_text, encryption_key):
-        x = np.array(image_array, copy=True)
-        n, m, z = 0, 0, 0
-        kl = 0
-        height, width, channels = x.shape
-        
-        # Hide length first
-        length_bytes = len(secret_text).to_bytes(4, byteorder='big')
-        for byte in length_bytes:
-            encrypted_byte = byte ^ self.d[encryption_key[kl]]
-            for bit_pos in range(8):
-                if n >= height:
-                    raise ValueError("Image too small for the secret text")
-                
-                bit = (encrypted_byte >> (7 - bit_pos)) & 1
-                x[n, m, z] = (x[n, m, z] & 0xFE) | bit
-                z = (z + 1) % 3
-                if z == 0:
-                    m += 1
-                    if m >= width:
-                        m = 0
-                        n += 1
-            kl = (kl + 1) % len(encryption_key)
-        
-        # Hide encrypted text
-        for char in secret_text:
-            encrypted_char = self.d[char] ^ self.d[encryption_key[kl]]
-            for bit_pos in range(8):
-                if n >= height:
-                    raise ValueError("Image too small for the secret text")
-                
-                bit = (encrypted_char >> (7 - bit_pos)) & 1
-                x[n, m, z] = (x[n, m, z] & 0xFE) | bit
-                z = (z + 1) % 3
-                if z == 0:
-                    m += 1
-                    if m >= width:
-                        m = 0
-                        n += 1
-            kl = (kl + 1) % len(encryption_key)
-        
-        return x
+    def _apply_key(self, data, encryption_key, start=0):
+        """XOR data with the repeating key, continuing across header and text"""
+        data = np.frombuffer(data, dtype=np.uint8)
+        key = _key_bytes(encryption_key)
+        # The key rotated to the payload position, tiled over the whole buffer
+        stream = np.tile(np.roll(key, -(start % key.size)), -(-data.size // key.size))[:data.size]
+        return (data ^ stream).tobytes()
     
-    def extract_data(self, image_array, encryption_key):
-        x = image_array
-        n, m, z = 0, 0, 0
-        kl = 0
-        height, width, channels = x.shape
-        
-        # Extract length
-        length_bytes = bytearray()
-        for _ in range(4):
-            byte_val = 0
-            for bit_pos in range(8):
-                if n >= height:
-                    return ""  # No data found
-                
-                bit = x[n, m, z] & 1
-                byte_val = (byte_val << 1) | bit
-                z = (z + 1) % 3
-                if z == 0:
-                    m += 1
-                    if m >= width:
-                        m = 0
-                        n += 1
-            decrypted_byte = byte_val ^ self.d[encryption_key[kl]]
-            length_bytes.append(decrypted_byte)
-            kl = (kl + 1) % len(encryption_key)
-        
-        text_length = int.from_bytes(length_bytes, byteorder='big')
-        
-        # Extract and decrypt text
-        extracted_text = ""
-        for _ in range(text_length):
-            if n >= height:
-                break
-                
-            char_val = 0
-            for bit_pos in range(8):
-                if n >= height:
-                    break
-                    
-                bit = x[n, m, z] & 1
-                char_val = (char_val << 1) | bit
-                z = (z + 1) % 3
-                if z == 0:
-                    m += 1
-                    if m >= width:
-                        m = 0
-                        n += 1
-            decrypted_char = self.c[char_val ^ self.d[encryption_key[kl]]]
-            extracted_text += decrypted_char
-            kl = (kl + 1) % len(encryption_key)
+    def _mask_length(self, length_bytes, encryption_key):
+        return self._apply_key(length_bytes, encryption_key)
+    
+    def _sealer(self, encryption_key):
+        # The key stream continues from byte 4, after the length
+        position = 4
         
-        return extracted_text
\ No newline at end of file
+        def seal(chunk):
+            nonlocal position
+            encrypted = self._apply_key(chunk, encryption_key, start=position)
+            position += len(encrypted)
+            return encrypted
+        return b'', seal, bytes
+    
+    def _open(self, read, length, encryption_key, chunk_size):
+        for start, count in bitplane.iter_ranges(length, chunk_size):
+            yield self._apply_key(read(start, count), encryption_key, start=4 + start)
+
+
+engines.register(XORSteganography())